@@ -2,10 +2,25 @@
 
 """
 
+import errno
+import hashlib
+import json
 import os
+import random
+import re
+import select
+import socket
+import stat
+import struct
+import sys
 import threading
+import time
+import weakref
+from Queue import Queue
+from collections import deque
+from contextlib import contextmanager
 from ConfigParser import RawConfigParser
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 class ConfigItem(str):
@@ -90,19 +105,20 @@ class ConfigItem(str):
         return ret
 
 
-class BindInfo:
-    """Contains the information of a configuration-variable binding
+class BindInfo(object):
+    """Contains the information of a configuration-variable binding. The bound object is weakly referenced if it
+    supports weak references, so the binding does not keep it alive.
 
     Attributes:
         key(str): the configuration key
-        obj(object): the object to which the configuration key binds
+        obj(object): the object to which the configuration key binds, None if it has been garbage-collected
         attr(str): the attribute to which the configuration key binds
         method (str): the name of a ConfigItem method for type conversion(name starts with 'as_'). If it is None, no
             conversion will be done. That is, the value will be a str.
         default_value (object): the default value to set if the key does not exist in the configuration.
     """
 
-    def __init__(self, key, obj, attr, method, default_value):
+    def __init__(self, key, obj, attr, method, default_value, callback=None):
         """Initialize all information
 
         Args:
@@ -112,13 +128,367 @@ class BindInfo:
             method (str): the name of a ConfigItem method for type conversion(name starts with 'as_'). If it is None, no
                 conversion will be done. That is, the value will be a str.
             default_value (object): the default value to set if the key does not exist in the configuration.
+            callback (callable): called with the weak reference when obj is garbage-collected
         """
         self.key = key
-        self.obj = obj
+        try:
+            self.__obj_ref = weakref.ref(obj, callback)
+        except TypeError:
+            # obj does not support weak references
+            self.__obj_ref = lambda: obj
         self.attr = attr
         self.method = method
         self.default_value = default_value
 
+    @property
+    def obj(self):
+        return self.__obj_ref()
+
+
+class ConfigChange(object):
+    """Represents the change of a configuration item made by a reload.
+
+    Attributes:
+        key (str): the configuration key
+        old_value (ConfigItem): the value before the reload, None if the key was added
+        new_value (ConfigItem): the value after the reload, None if the key was removed
+        source (str): the configuration in which the change happened
+        generation (int): the generation of the configuration after the reload
+        timestamp (datetime): the time when the change happened
+    """
+
+    __slots__ = ('key', 'old_value', 'new_value', 'source', 'generation', 'timestamp')
+
+    def __init__(self, key, old_value, new_value, source, generation, timestamp):
+        """Initialize all information
+
+        Args:
+            key (str): the configuration key
+            old_value (ConfigItem): the value before the reload, None if the key was added
+            new_value (ConfigItem): the value after the reload, None if the key was removed
+            source (str): the configuration in which the change happened
+            generation (int): the generation of the configuration after the reload
+            timestamp (datetime): the time when the change happened
+        """
+        self.key = key
+        self.old_value = old_value
+        self.new_value = new_value
+        self.source = source
+        self.generation = generation
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return 'ConfigChange(%r, %r, %r, %r, %d)' % (self.key, self.old_value, self.new_value, self.source,
+                                                      self.generation)
+
+
+class ConfigHistory(object):
+    """A bounded history of the changes made by reloads. The oldest changes are evicted when the history holds more than
+    max_size changes or when they are older than max_age.
+
+    Usage:
+        history = ConfigHistory(max_size=10000, max_age=timedelta(days=1))
+        config.set_history(history)
+        ...
+        for change in history.query(prefix='db.'):
+            print change.key, change.old_value, change.new_value
+
+    Attributes:
+        max_size (int): the maximum number of changes to keep
+        max_age (timedelta): the maximum age of the changes to keep. If it is None, changes are evicted by size only.
+    """
+
+    def __init__(self, max_size=1000, max_age=None):
+        """Initialize the history
+
+        Args:
+            max_size (int): the maximum number of changes to keep
+            max_age (timedelta|int|float): the maximum age of the changes to keep, in seconds if it is a number. If it
+                is None, changes are evicted by size only.
+
+        Raises:
+            ValueError: if max_size is not positive
+        """
+        if max_size <= 0:
+            raise ValueError('max_size should be positive')
+        if max_age is not None and not isinstance(max_age, timedelta):
+            max_age = timedelta(seconds=max_age)
+        self.max_size = max_size
+        self.max_age = max_age
+        self.__changes = deque(maxlen=max_size)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__changes)
+
+    def __evict(self, now):
+        """Evicts the expired changes from the oldest recorded one. Timestamps may go backwards, e.g. after the wall
+        clock is adjusted, so an expired change recorded after an unexpired one is kept until that one is evicted.
+        """
+        if self.max_age is None:
+            return
+        changes = self.__changes
+        expire_time = now - self.max_age
+        while len(changes) > 0 and changes[0].timestamp < expire_time:
+            changes.popleft()
+
+    def record(self, source, generation, changes, timestamp=None):
+        """Records the changes made by a reload.
+
+        Args:
+            source (str): the configuration in which the changes happened
+            generation (int): the generation of the configuration after the reload
+            changes (list of (str, ConfigItem, ConfigItem)): the (key, old_value, new_value) changes
+            timestamp (datetime): the time when the changes happened. If it is None, the current time is used. It may be
+                earlier than the timestamps of the changes recorded before.
+        """
+        if timestamp is None:
+            timestamp = datetime.now()
+        with self.__lock:
+            append = self.__changes.append
+            for key, old_value, new_value in changes:
+                append(ConfigChange(key, old_value, new_value, source, generation, timestamp))
+            self.__evict(timestamp)
+
+    def query(self, key=None, prefix=None, start_time=None, end_time=None):
+        """Returns the unexpired changes matching all the specified conditions, in the order they were recorded.
+
+        Args:
+            key (str): if it is not None, only return the changes of this key
+            prefix (str): if it is not None, only return the changes of the keys starting with this prefix
+            start_time (datetime): if it is not None, only return the changes happened at or after this time
+            end_time (datetime): if it is not None, only return the changes happened before this time
+
+        Returns:
+            list of ConfigChange: the matching changes
+        """
+        now = datetime.now()
+        if self.max_age is not None:
+            expire_time = now - self.max_age
+            if start_time is None or start_time < expire_time:
+                start_time = expire_time
+        with self.__lock:
+            self.__evict(now)
+            ret = []
+            # the timestamps are not necessarily ordered, so all changes are checked
+            for change in self.__changes:
+                if start_time is not None and change.timestamp < start_time:
+                    continue
+                if end_time is not None and change.timestamp >= end_time:
+                    continue
+                if key is not None and change.key != key:
+                    continue
+                if prefix is not None and not change.key.startswith(prefix):
+                    continue
+                ret.append(change)
+            return ret
+
+    def clear(self):
+        """Removes all recorded changes.
+        """
+        with self.__lock:
+            self.__changes.clear()
+
+
+_MAX_MISSING_KEYS = 10000
+
+_REFERENCE_PATTERN = re.compile(r'\$\{([^}]*)\}')
+
+
+def _sizeof(obj, seen):
+    """Returns the size of obj in bytes, or 0 if obj is in seen. obj is added to seen.
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    return sys.getsizeof(obj)
+
+
+def _sizeof_item(item, seen):
+    """Returns the (value payload, overhead) sizes of a ConfigItem in bytes. The overhead includes the str header, the
+    attribute dict and the attributes not shared with other items.
+    """
+    if id(item) in seen:
+        return 0, 0
+    size = _sizeof(item, seen)
+    overhead = size - len(item) + _sizeof(item.__dict__, seen)
+    for v in item.__dict__.itervalues():
+        overhead += _sizeof(v, seen)
+    return len(item), overhead
+
+
+def _sizeof_deep(obj, seen):
+    """Returns the size of obj and the dicts, lists, tuples and deques it contains in bytes. Objects in seen are not
+    counted.
+    """
+    if id(obj) in seen:
+        return 0
+    size = _sizeof(obj, seen)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += _sizeof_deep(k, seen) + _sizeof_deep(v, seen)
+    elif isinstance(obj, (list, tuple, deque)):
+        for v in list(obj):
+            size += _sizeof_deep(v, seen)
+    return size
+
+
+class _Interpolator(object):
+    """Resolves ${key} references in configuration values.
+
+    Resolved values are memoized until one of the keys they depend on changes. Values without references and values
+    failing to resolve are not memoized, but the keys they reference are recorded in the dependency graph.
+    """
+
+    def __init__(self, lookup):
+        """
+        Args:
+            lookup (callable): returns the raw ConfigItem of a key, or None if the key does not exist
+        """
+        self.__lookup = lookup
+        self.__resolved = dict()
+        self.__dependents = dict()
+        self.__epoch = 0
+        self.__lock = threading.Lock()
+
+    def resolve(self, key):
+        """Returns the configuration item of the key with all references resolved.
+
+        Args:
+            key (str): the configuration key
+
+        Returns:
+            ConfigItem: the resolved configuration item, or None if the key does not exist
+
+        Raises:
+            ValueError: if a reference can not be resolved or references are circular
+        """
+        item = self.__resolved.get(key)
+        if item is not None:
+            return item
+        epoch = self.__epoch
+        resolved = dict()
+        failed = dict()
+        try:
+            return self.__resolve(key, [], resolved, failed)
+        finally:
+            if len(resolved) > 0 or len(failed) > 0:
+                with self.__lock:
+                    if epoch == self.__epoch:
+                        # nothing has been invalidated while resolving
+                        for k, (v, deps) in resolved.iteritems():
+                            self.__resolved[k] = v
+                            self.__add_dependent(k, deps)
+                        # failed keys are not memoized, but they must be invalidated when their references change
+                        for k, deps in failed.iteritems():
+                            self.__add_dependent(k, deps)
+
+    def __add_dependent(self, key, deps):
+        for dep in deps:
+            self.__dependents.setdefault(dep, set()).add(key)
+
+    def __resolve(self, key, stack, resolved, failed):
+        item = self.__resolved.get(key)
+        if item is not None:
+            return item
+        if key in resolved:
+            return resolved[key][0]
+        raw = self.__lookup(key)
+        if raw is None or '${' not in raw:
+            return raw
+        if key in stack:
+            raise ValueError('Circular reference: ' + ' -> '.join(stack[stack.index(key):] + [key]))
+        stack.append(key)
+        deps = set()
+
+        def replace(match):
+            ref = match.group(1).strip()
+            deps.add(ref)
+            value = self.__resolve(ref, stack, resolved, failed)
+            if value is None:
+                raise ValueError('Unresolved reference ${%s} in %s' % (ref, key))
+            return value
+
+        try:
+            value = _REFERENCE_PATTERN.sub(replace, raw)
+        except ValueError:
+            failed[key] = deps
+            raise
+        stack.pop()
+        item = ConfigItem(key, value, raw.source, raw.last_update_time)
+        resolved[key] = (item, deps)
+        return item
+
+    def resolved_items(self):
+        """Returns the memoized resolved items.
+
+        Returns:
+            list of ConfigItem: the memoized resolved items
+        """
+        return self.__resolved.values()
+
+    def invalidate(self, keys):
+        """Discards the resolved values depending on the changed keys.
+
+        Args:
+            keys (set of str): the changed keys. If it is None, all resolved values are discarded.
+
+        Returns:
+            set of str: the changed keys and all keys depending on them, None if keys is None
+        """
+        with self.__lock:
+            self.__epoch += 1
+            if keys is None:
+                self.__resolved.clear()
+                self.__dependents.clear()
+                return None
+            ret = set(keys)
+            pending = list(keys)
+            while len(pending) > 0:
+                key = pending.pop()
+                self.__resolved.pop(key, None)
+                for dependent in self.__dependents.pop(key, ()):
+                    if dependent not in ret:
+                        ret.add(dependent)
+                        pending.append(dependent)
+            return ret
+
+
+class _Pin(object):
+    """The configurations pinned by BaseConfig.pinned in the current thread.
+
+    Attributes:
+        item_dicts (dict): a (BaseConfig, dict) dict mapping each pinned configuration to its item dict when pinned
+        interpolators (dict): a (BaseConfig, _Interpolator) dict containing the interpolators resolving pinned values
+    """
+
+    def __init__(self, item_dicts):
+        self.item_dicts = item_dicts
+        self.interpolators = dict()
+
+
+class _PinLocal(threading.local):
+    pin = None
+
+
+_pin_local = _PinLocal()
+
+
+def _get_pin():
+    return _pin_local.pin
+
+
+def _set_pin(pin):
+    """Pins the configurations in the current thread, and returns the token to restore the outer pin with _reset_pin.
+    """
+    token = _pin_local.pin
+    _pin_local.pin = pin
+    return token
+
+
+def _reset_pin(token):
+    _pin_local.pin = token
+
 
 class BaseConfig(object):
     """Base class of configuration
@@ -126,6 +496,9 @@ class BaseConfig(object):
     Attributes:
         name (str): the name of this configuration
         base_config (BaseConfig): the base configuration, may be None.
+        generation (int): the number of reloads which have changed the items of this configuration
+        last_listener_error (Exception): the last exception raised by a listener of this configuration, None if there
+            is none
         __item_dict (dict): a dict containing all configuration items
     """
 
@@ -143,8 +516,21 @@ class BaseConfig(object):
             self.__item_dict = dict()
         else:
             self.__item_dict = item_dict
+        self.generation = 0
+        self.last_listener_error = None
         self.__bind_dict = dict()
+        self.__dead_binds = deque()
         self.__lock = threading.Lock()
+        self.__history = None
+        self.__committed = False
+        self.__interpolator = None
+        self.__missing_keys = set()
+        self.__missing_epoch = 0
+        self.__missing_lock = threading.Lock()
+        self.__listeners = ()
+        self.__derived = weakref.WeakSet()
+        if base_config is not None:
+            base_config.__derived.add(self)
 
     def __getitem__(self, key):
         """Returns the configuration item.
@@ -157,14 +543,120 @@ class BaseConfig(object):
 
         Raises:
             KeyError: if there is no configuration item matches the specified key
+            ValueError: if interpolation is enabled and a reference in the value can not be resolved
         """
-        try:
-            return self.__item_dict[key]
-        except KeyError:
-            if self.base_config is None:
-                raise
-            else:
-                return self.base_config[key]
+        item = self.__get(key, _get_pin())
+        if item is None:
+            raise KeyError(key)
+        return item
+
+    def get(self, key, default=None):
+        """Returns the configuration item, or the default value if the key does not exist. Unlike __getitem__, no
+        exception is raised for missing keys, and repeated lookups of a missing key are answered from a negative cache.
+
+        Args:
+            key (str): the configuration key
+            default (object): the value to return if the key does not exist
+
+        Returns:
+            ConfigItem: the corresponding configuration item, or the default value if the key does not exist
+
+        Raises:
+            ValueError: if interpolation is enabled and a reference in the value can not be resolved
+        """
+        item = self.__get(key, _get_pin())
+        if item is None:
+            return default
+        return item
+
+    def get_as(self, key, method, default=None):
+        """Returns the configuration value converted by a ConfigItem method, or the default value if the key does not
+        exist.
+
+        Usage:
+            # returns 4096 if 'buffer_size' does not exist
+            get_as('buffer_size', 'as_int', 4096)
+
+        Args:
+            key (str): the configuration key
+            method (str): the name of a ConfigItem method for type conversion(name starts with 'as_')
+            default (object): the value to return if the key does not exist
+
+        Returns:
+            object: the converted value, or the default value if the key does not exist
+
+        Raises:
+            TypeError: if method is None or not of type str
+            ValueError: if method is not a method for type conversion, or the value can not be converted
+        """
+        if method is None:
+            # unlike bind, get_as has no use for the raw item
+            raise TypeError('method should be of str type')
+        self.__check_method(method)
+        item = self.__get(key, _get_pin())
+        if item is None:
+            return default
+        return getattr(item, method)()
+
+    def __get(self, key, pin):
+        """Returns the configuration item of the key, or None if the key does not exist.
+
+        Args:
+            key (str): the configuration key
+            pin (_Pin): the pinned configurations to read from, None to read the current items
+        """
+        if pin is not None:
+            return self.__get_pinned(key, pin)
+        if self.__interpolator is None:
+            return self.__lookup(key)
+        return self.__interpolator.resolve(key)
+
+    def __get_pinned(self, key, pin):
+        if self.__interpolator is None:
+            return self.__lookup_pinned(key, pin.item_dicts)
+        interpolator = pin.interpolators.get(self)
+        if interpolator is None:
+            # the memoized values of the current items can not be used
+            item_dicts = pin.item_dicts
+            interpolator = _Interpolator(lambda k: self.__lookup_pinned(k, item_dicts))
+            pin.interpolators[self] = interpolator
+        return interpolator.resolve(key)
+
+    def __lookup_pinned(self, key, item_dicts):
+        config = self
+        while config is not None:
+            item = item_dicts.get(config, config.__item_dict).get(key)
+            if item is not None:
+                return item
+            config = config.base_config
+        return None
+
+    def __current_item_dict(self):
+        pin = _get_pin()
+        if pin is None:
+            return self.__item_dict
+        return pin.item_dicts.get(self, self.__item_dict)
+
+    def __lookup(self, key):
+        """Returns the raw configuration item of the key from this configuration or its base configurations, or None if
+        the key does not exist.
+        """
+        if key in self.__missing_keys:
+            return None
+        epoch = self.__missing_epoch
+        config = self
+        while config is not None:
+            item = config.__item_dict.get(key)
+            if item is not None:
+                return item
+            config = config.base_config
+        with self.__missing_lock:
+            # do not cache the miss if the key may have been added while looking it up
+            if epoch == self.__missing_epoch:
+                if len(self.__missing_keys) >= _MAX_MISSING_KEYS:
+                    self.__missing_keys = set()
+                self.__missing_keys.add(key)
+        return None
 
     def keys(self):
         """Returns all keys in this configuration(including all base configs).
@@ -172,9 +664,10 @@ class BaseConfig(object):
         Returns:
             list of str: all keys in this configuration.
         """
+        item_dict = self.__current_item_dict()
         if self.base_config is None:
-            return self.__item_dict.keys()
-        return list(set(self.__item_dict.keys()) | set(self.base_config.keys()))
+            return item_dict.keys()
+        return list(set(item_dict.keys()) | set(self.base_config.keys()))
 
     def items(self):
         """Returns all (key, ConfigItem) pairs in this configuration(including all base configs).
@@ -182,27 +675,101 @@ class BaseConfig(object):
         Returns:
             list of (key, ConfigItem) pairs: all items in this configuration.
         """
-        item_dict = self.__item_dict
+        item_dict = self.__current_item_dict()
         ret = item_dict.items()
         if self.base_config is not None:
             for k, v in self.base_config.items():
                 if k not in item_dict:
                     ret.append((k, v))
+        if self.__interpolator is not None:
+            pin = _get_pin()
+            ret = [(k, self.__get(k, pin)) for k, v in ret]
         return ret
 
+    @contextmanager
+    def pinned(self):
+        """Pins the current items of this configuration and all its base configurations. Within the context, all
+        lookups from these configurations in the current thread read the pinned items, even if the configurations are
+        reloaded. Nothing is copied, since reloads replace the item dicts instead of modifying them. Bound attributes
+        are always updated with the current items.
+
+        Usage:
+            with config.pinned():
+                prop = config['prop1']
+                int_prop = config['intProp'].as_int()
+
+        Returns:
+            BaseConfig: this configuration
+        """
+        outer = _get_pin()
+        item_dicts = dict() if outer is None else dict(outer.item_dicts)
+        config = self
+        while config is not None:
+            if config not in item_dicts:
+                item_dicts[config] = config.__item_dict
+            config = config.base_config
+        token = _set_pin(_Pin(item_dicts))
+        try:
+            yield self
+        finally:
+            _reset_pin(token)
+
     def __update_bound_attr(self, bind_info):
         """
         Args:
             bind_info(BindInfo):
         """
-        try:
-            value = self.__getitem__(bind_info.key)
-            if bind_info.method is None:
-                setattr(bind_info.obj, bind_info.attr, str(value))
-            else:
-                setattr(bind_info.obj, bind_info.attr, getattr(value, bind_info.method)())
-        except KeyError:
-            setattr(bind_info.obj, bind_info.attr, bind_info.default_value)
+        obj = bind_info.obj
+        if obj is None:
+            return
+        value = self.__get(bind_info.key, None)
+        if value is None:
+            setattr(obj, bind_info.attr, bind_info.default_value)
+        elif bind_info.method is None:
+            setattr(obj, bind_info.attr, str(value))
+        else:
+            setattr(obj, bind_info.attr, getattr(value, bind_info.method)())
+
+    @staticmethod
+    def __check_method(method):
+        if method is not None:
+            if type(method) is not str:
+                raise TypeError('method should be of str type')
+            if not method.startswith('as_') and not callable(getattr(ConfigItem, method, None)):
+                raise ValueError('Invalid method ' + method)
+
+    def __add_bind_info(self, key, obj, attr, method, default_value):
+        """Registers a binding, replacing the existing binding of the same key and attribute.
+
+        Returns:
+            BindInfo: the registered binding
+        """
+        info_dict = self.__bind_dict.get(key)
+        if info_dict is None:
+            info_dict = dict()
+            self.__bind_dict[key] = info_dict
+        index = (id(obj), attr)
+        dead_binds = self.__dead_binds
+        info = BindInfo(key, obj, attr, method, default_value, lambda ref: dead_binds.append((key, index)))
+        info_dict[index] = info
+        return info
+
+    def __purge_dead_binds(self):
+        """Removes the bindings whose objects have been garbage-collected. Weak reference callbacks only queue the
+        bindings, since they may run while the lock is held.
+        """
+        dead_binds = self.__dead_binds
+        while len(dead_binds) > 0:
+            key, index = dead_binds.popleft()
+            info_dict = self.__bind_dict.get(key)
+            if info_dict is None:
+                continue
+            info = info_dict.get(index)
+            # the id may have been reused by an object bound later
+            if info is not None and info.obj is None:
+                del info_dict[index]
+                if len(info_dict) == 0:
+                    del self.__bind_dict[key]
 
     def bind(self, key, obj, attr, method=None, default_value=None):
         """Bind the configuration key to an attribute. When the configuration value is updated, the associated attribute
@@ -211,6 +778,9 @@ class BaseConfig(object):
         Aware that all bound attributes are updated one by one. You SHOULD NEVER assume that multiple attributes will be
         updated simultaneously.
 
+        The object is weakly referenced if it supports weak references. The binding is removed automatically after the
+        object is garbage-collected.
+
         Usage:
             # bind 'data_path' to data_store.data_path
             bind('data_path', data_store, 'data_path')
@@ -231,21 +801,48 @@ class BaseConfig(object):
             ValueError: if method is not None and is not a method for type conversion(name starts with 'as_')
         """
         with self.__lock:
-            if method is not None:
-                if type(method) is not str:
-                    raise TypeError('method should be of str type')
-                if not method.startswith('as_') and not callable(getattr(ConfigItem, method, None)):
-                    raise ValueError('Invalid method ' + method)
-            if key not in self.__bind_dict:
-                info_list = []
-                self.__bind_dict[key] = info_list
-            else:
-                info_list = self.__bind_dict[key]
-
-            info = BindInfo(key, obj, attr, method, default_value)
-            info_list.append(info)
+            self.__check_method(method)
+            self.__purge_dead_binds()
+            info = self.__add_bind_info(key, obj, attr, method, default_value)
             self.__update_bound_attr(info)
 
+    def bind_many(self, bindings):
+        """Bind many configuration keys to attributes in one pass. See bind for details.
+
+        Usage:
+            bind_many([('data_path', data_store, 'data_path'),
+                       ('buffer_size', channel, 'buffer_size', 'as_int', 4096)])
+
+        Args:
+            bindings (iterable of tuple): (key, obj, attr[, method[, default_value]]) tuples, whose elements are the
+                same as the arguments of bind
+
+        Returns:
+            list of ValueError: the failures of setting attribute values, None if there is no failure. The failed
+                bindings are still registered.
+
+        Raises:
+            TypeError: if a method is not None and is not of type str
+            ValueError: if a method is not None and is not a method for type conversion(name starts with 'as_')
+        """
+        bindings = [tuple(binding) for binding in bindings]
+        for i in range(0, len(bindings)):
+            if not 3 <= len(bindings[i]) <= 5:
+                raise TypeError('binding should be a (key, obj, attr[, method[, default_value]]) tuple')
+            bindings[i] += (None,) * (5 - len(bindings[i]))
+            self.__check_method(bindings[i][3])
+        with self.__lock:
+            self.__purge_dead_binds()
+            info_list = [self.__add_bind_info(*binding) for binding in bindings]
+            bind_failure = []
+            for info in info_list:
+                try:
+                    self.__update_bound_attr(info)
+                except ValueError as e:
+                    bind_failure.append(e)
+            if len(bind_failure) > 0:
+                return bind_failure
+
     def unbind_all(self, key):
         """Unbind the key from its associated attributes. Restore all attributes to their default values.
 
@@ -256,9 +853,12 @@ class BaseConfig(object):
             KeyError: if the key has not been bound to any attribute
         """
         with self.__lock:
-            info_list = self.__bind_dict.pop(key)
-            for info in info_list:
-                setattr(info.obj, info.attr, info.default_value)
+            self.__purge_dead_binds()
+            info_dict = self.__bind_dict.pop(key)
+            for info in info_dict.itervalues():
+                obj = info.obj
+                if obj is not None:
+                    setattr(obj, info.attr, info.default_value)
 
     def unbind_one(self, key, obj, attr):
         """Unbind the key from one of its associated attributes. Restore the attribute to its default value.
@@ -272,43 +872,264 @@ class BaseConfig(object):
             KeyError: if the key has not been bound to the specified attribute
         """
         with self.__lock:
-            info_list = self.__bind_dict[key]
-            for i in range(0, len(info_list)):
-                info = info_list[i]
-                if info.obj == obj and info.attr == attr:
-                    setattr(obj, attr, info.default_value)
-                    del info_list[i]
-                    if len(info_list) == 0:
-                        del self.__bind_dict[key]
-                    return
-            raise KeyError('No key has been bound to %s.%s' % (obj, attr))
+            self.__purge_dead_binds()
+            info_dict = self.__bind_dict[key]
+            index = (id(obj), attr)
+            info = info_dict.get(index)
+            if info is None or info.obj is not obj:
+                raise KeyError('No key has been bound to %s.%s' % (obj, attr))
+            setattr(obj, attr, info.default_value)
+            del info_dict[index]
+            if len(info_dict) == 0:
+                del self.__bind_dict[key]
+
+    def set_interpolation(self, enabled=True):
+        """Enables or disables the interpolation of values read from this configuration. When it is enabled, a
+        reference like ${paths.root} in a value is replaced by the value of paths.root, looked up from this
+        configuration(including all base configs). Resolved values are memoized until a reload changes one of the keys
+        they depend on.
+
+        Usage:
+            config = DictConfig('test', {'paths.root': '/srv', 'paths.data': '${paths.root}/data'})
+            config.set_interpolation()
+            config['paths.data']  # '/srv/data'
+
+        Args:
+            enabled (bool): whether interpolation is enabled
+        """
+        if enabled:
+            if self.__interpolator is None:
+                self.__interpolator = _Interpolator(self.__lookup)
+        else:
+            self.__interpolator = None
+
+    def add_listener(self, listener):
+        """Adds a listener which is called after the items of this configuration or its base configurations change.
+
+        The listener is called with (config, keys), where keys is the set of changed keys(including the keys whose
+        interpolated values depend on them), or None if the changes are unknown. It is called by the thread reloading
+        the changed configuration while the configuration is locked, so it should return quickly and never reload or
+        bind. An exception raised by the listener is recorded in last_listener_error instead of failing the reload.
+
+        Args:
+            listener (callable): the listener to add
+        """
+        with self.__lock:
+            self.__listeners += (listener,)
+
+    def remove_listener(self, listener):
+        """Removes a listener added by add_listener.
+
+        Args:
+            listener (callable): the listener to remove
+
+        Raises:
+            ValueError: if the listener has not been added
+        """
+        with self.__lock:
+            listeners = list(self.__listeners)
+            listeners.remove(listener)
+            self.__listeners = tuple(listeners)
+
+    def set_history(self, history):
+        """Records the changes made by reloads of this configuration and all its base configurations in the history.
+
+        Args:
+            history (ConfigHistory): the history to record changes in. If it is None, changes are no longer recorded.
+        """
+        config = self
+        while config is not None:
+            config.__history = history
+            config = config.base_config
 
     def reload(self, update_bind=True):
         with self.__lock:
             if self.base_config is not None:
                 self.base_config.reload(False)
-            self._do_reload()
-            if not update_bind:
-                return
+            return self.__reload(update_bind)
 
-            bind_failure = []
-            for info_list in self.__bind_dict.itervalues():
-                for info in info_list:
-                    try:
-                        self.__update_bound_attr(info)
-                    except ValueError as e:
-                        bind_failure.append(e)
-            if len(bind_failure) > 0:
-                return bind_failure
+    def _reload_layer(self):
+        """Reloads this configuration without reloading its base configurations, and updates the bound attributes.
+
+        Returns:
+            list of ValueError: the errors of the bound attributes failed to update, None if there is no failure
+        """
+        with self.__lock:
+            return self.__reload(True)
+
+    def __reload(self, update_bind):
+        """Reloads the items of this configuration. Must be called with the lock held.
+        """
+        self.__committed = False
+        self._do_reload()
+        if not self.__committed:
+            # _do_reload changed the items in an unknown way
+            self.__commit(None)
+        if not update_bind:
+            return
+
+        self.__purge_dead_binds()
+        bind_failure = []
+        for info_dict in self.__bind_dict.itervalues():
+            for info in info_dict.itervalues():
+                try:
+                    self.__update_bound_attr(info)
+                except ValueError as e:
+                    bind_failure.append(e)
+        if len(bind_failure) > 0:
+            return bind_failure
 
     def _do_reload(self):
+        # the items may have been changed in place, so the changes are unknown
         pass
 
     def _get_item_dict(self):
         return dict(self.__item_dict)
 
-    def _set_item_dict(self, item_dict):
-        self.__item_dict = dict(item_dict)
+    def _set_item_dict(self, item_dict, changes=None):
+        """Replaces the items of this configuration.
+
+        Args:
+            item_dict (dict): the new item dict
+            changes (list of (str, ConfigItem, ConfigItem)): the (key, old_value, new_value) changes made to the items.
+                If it is None, the changes are unknown. If it is empty, item_dict is ignored.
+        """
+        if changes is None or len(changes) > 0:
+            item_dict = dict(item_dict)
+        self._replace_item_dict(item_dict, changes)
+
+    def _replace_item_dict(self, item_dict, changes=None):
+        """Replaces the items of this configuration with item_dict without copying it. The caller must not modify
+        item_dict afterwards, so it is usually a copy returned by _get_item_dict.
+
+        Args:
+            item_dict (dict): the new item dict
+            changes (list of (str, ConfigItem, ConfigItem)): the (key, old_value, new_value) changes made to the items.
+                If it is None, the changes are unknown. If it is empty, item_dict is ignored.
+        """
+        if changes is None or len(changes) > 0:
+            self.__item_dict = item_dict
+        self.__commit(changes)
+
+    def __commit(self, changes):
+        self.__committed = True
+        if changes is not None and len(changes) == 0:
+            return
+        self.generation += 1
+        history = self.__history
+        if history is not None and changes is not None:
+            history.record(self.name, self.generation, changes)
+        self.__notify(None if changes is None else set(change[0] for change in changes))
+
+    def __notify(self, keys):
+        """Invalidates the cached state of this configuration and all configurations based on it, then calls their
+        listeners.
+
+        Args:
+            keys (set of str): the changed keys. If it is None, the changes are unknown.
+        """
+        notifications = []
+        self.__invalidate(keys, notifications)
+        for config, listeners, changed_keys in notifications:
+            for listener in listeners:
+                try:
+                    listener(config, changed_keys)
+                except Exception as e:
+                    # the items have been committed, so a failing listener must not fail the reload or skip the others
+                    config.last_listener_error = e
+
+    def __invalidate(self, keys, notifications):
+        """Invalidates the cached state of this configuration and all configurations based on it.
+
+        Args:
+            keys (set of str): the changed keys. If it is None, the changes are unknown.
+            notifications (list): the (config, listeners, changed_keys) tuples of the listeners to call are appended
+        """
+        with self.__missing_lock:
+            self.__missing_epoch += 1
+            if keys is None:
+                self.__missing_keys = set()
+            else:
+                self.__missing_keys.difference_update(keys)
+        changed_keys = keys
+        interpolator = self.__interpolator
+        if interpolator is not None:
+            changed_keys = interpolator.invalidate(keys)
+        notifications.append((self, self.__listeners, changed_keys))
+        for config in list(self.__derived):
+            config.__invalidate(keys, notifications)
+
+    def memory_usage(self, prefix_depth=1):
+        """Returns an estimate of the memory used by this configuration and all its base configurations, as measured by
+        sys.getsizeof. Objects shared by several items, layers or configurations are counted once. It takes a linear
+        scan of all items and bindings without locking, so it is cheap enough to be exported periodically.
+
+        Usage:
+            usage = config.memory_usage()
+            for layer in usage['layers']:
+                print layer['name'], layer['total']
+
+        Args:
+            prefix_depth (int): the number of dot-separated parts of a key used as its prefix, e.g. 'db' for 'db.port'
+                with prefix_depth 1
+
+        Returns:
+            dict: the usage report containing the following keys, with all sizes in bytes:
+                total (int): the total size
+                layers (list of dict): the usage of each configuration from this one to the root, containing name,
+                    item_count, key_bytes, value_bytes, item_overhead_bytes, item_dict_bytes, bind_count,
+                    bind_bytes, cache_bytes, source_bytes(see _source_memory_usage) and total
+                prefixes (dict): a (str, int) dict mapping each key prefix to the size of its keys and items
+        """
+        seen = set()
+        layers = []
+        prefixes = dict()
+        config = self
+        while config is not None:
+            item_dict = config.__item_dict
+            layer = dict(name=config.name, item_count=len(item_dict), key_bytes=0, value_bytes=0,
+                         item_overhead_bytes=0, item_dict_bytes=_sizeof(item_dict, seen), bind_count=0,
+                         bind_bytes=_sizeof(config.__bind_dict, seen), cache_bytes=0)
+            for k, item in item_dict.items():
+                key_bytes = _sizeof(k, seen)
+                value_bytes, overhead = _sizeof_item(item, seen)
+                layer['key_bytes'] += key_bytes
+                layer['value_bytes'] += value_bytes
+                layer['item_overhead_bytes'] += overhead
+                prefix = '.'.join(k.split('.', prefix_depth)[:prefix_depth])
+                prefixes[prefix] = prefixes.get(prefix, 0) + key_bytes + value_bytes + overhead
+            for k, info_dict in config.__bind_dict.items():
+                layer['bind_bytes'] += _sizeof(k, seen) + _sizeof(info_dict, seen)
+                for index, info in info_dict.items():
+                    layer['bind_count'] += 1
+                    layer['bind_bytes'] += _sizeof(index, seen) + _sizeof(info, seen) + _sizeof(info.__dict__, seen)
+                    for v in info.__dict__.itervalues():
+                        layer['bind_bytes'] += _sizeof(v, seen)
+            layer['cache_bytes'] = _sizeof(config.__missing_keys, seen)
+            interpolator = config.__interpolator
+            if interpolator is not None:
+                for item in interpolator.resolved_items():
+                    value_bytes, overhead = _sizeof_item(item, seen)
+                    layer['cache_bytes'] += value_bytes + overhead
+            layer['source_bytes'] = config._source_memory_usage(seen)
+            layer['total'] = (layer['key_bytes'] + layer['value_bytes'] + layer['item_overhead_bytes'] +
+                              layer['item_dict_bytes'] + layer['bind_bytes'] + layer['cache_bytes'] +
+                              layer['source_bytes'])
+            layers.append(layer)
+            config = config.base_config
+        return dict(total=sum(layer['total'] for layer in layers), layers=layers, prefixes=prefixes)
+
+    def _source_memory_usage(self, seen):
+        """Returns the size in bytes of the data this configuration keeps besides its items, e.g. the values its items
+        are loaded from. Subclasses keeping such data should override it.
+
+        Args:
+            seen (set): the ids of the objects already counted, which should not be counted again
+
+        Returns:
+            int: the size in bytes
+        """
+        return 0
 
     def copy(self):
         """Returns a shallow copy of this configuration
@@ -317,8 +1138,11 @@ class BaseConfig(object):
             BaseConfiguration. a shallow copy of this configuration
         """
         if self.base_config is None:
-            return BaseConfig(self.name, None, self.__item_dict)
-        return BaseConfig(self.name, self.base_config.copy(), self.__item_dict)
+            ret = BaseConfig(self.name, None, self.__item_dict)
+        else:
+            ret = BaseConfig(self.name, self.base_config.copy(), self.__item_dict)
+        ret.set_interpolation(self.__interpolator is not None)
+        return ret
 
 
 def _update_from_dict(source, item_dict, value_dict):
@@ -328,15 +1152,57 @@ def _update_from_dict(source, item_dict, value_dict):
         source (str): the name of source configuration, which is used to create a new ConfigItem.
         item_dict (dict): the dict to be updated.
         value_dict (dict): the source dict
+
+    Returns:
+        list of (str, ConfigItem, ConfigItem): the (key, old_value, new_value) changes made to item_dict
     """
     now = datetime.now()
+    changes = []
     for k, v in value_dict.iteritems():
-        item = item_dict.get(k)
-        if item != v:
-            item_dict[k] = ConfigItem(k, v, source, now)
+        _update_item(source, item_dict, k, v, now, changes)
+    _remove_missing_items(item_dict, value_dict, changes)
+    return changes
+
+
+def _update_item(source, item_dict, key, value, now, changes):
+    """Update a single item of item_dict, appending the change to changes if the value differs.
+    """
+    item = item_dict.get(key)
+    if item is None or item != value.strip():
+        new_item = ConfigItem(key, value, source, now)
+        item_dict[key] = new_item
+        changes.append((key, item, new_item))
+
+
+def _remove_missing_items(item_dict, keys, changes):
+    """Remove the items whose keys are not in keys, appending the removals to changes.
+    """
     for k in item_dict.keys():
-        if k not in value_dict:
-            del item_dict[k]
+        if k not in keys:
+            changes.append((k, item_dict.pop(k), None))
+
+
+def _update_from_changed_keys(source, item_dict, value_dict, keys):
+    """Update the items of the changed keys in item_dict using key-value pairs from value_dict.
+
+    Args:
+        source (str): the name of source configuration, which is used to create a new ConfigItem.
+        item_dict (dict): the dict to be updated.
+        value_dict (dict): the source dict
+        keys (set of str): the keys changed in value_dict
+
+    Returns:
+        list of (str, ConfigItem, ConfigItem): the (key, old_value, new_value) changes made to item_dict
+    """
+    now = datetime.now()
+    changes = []
+    for k in keys:
+        v = value_dict.get(k)
+        if v is not None:
+            _update_item(source, item_dict, k, v, now, changes)
+        elif k in item_dict:
+            changes.append((k, item_dict.pop(k), None))
+    return changes
 
 
 def _update_from_ini(source, item_dict, filename):
@@ -346,25 +1212,104 @@ def _update_from_ini(source, item_dict, filename):
         source (str): the name of source configuration, which is used to create a new ConfigItem.
         item_dict (dict): the dict to be updated.
         filename (str): the path to the INI file
+
+    Returns:
+        list of (str, ConfigItem, ConfigItem): the (key, old_value, new_value) changes made to item_dict
     """
     parser = RawConfigParser()
     parser.read(filename)
     now = datetime.now()
     keys = set()
+    changes = []
     for section in parser.sections():
         for k, v in parser.items(section):
             k = section + '.' + k
             keys.add(k)
-            item = item_dict.get(k)
-            if item != v:
-                item_dict[k] = ConfigItem(k, v, source, now)
-    for k in item_dict.keys():
-        if k not in keys:
-            del item_dict[k]
+            _update_item(source, item_dict, k, v, now, changes)
+    _remove_missing_items(item_dict, keys, changes)
+    return changes
 
 
-class DictConfig(BaseConfig):
-    """Represents a configuration from a dict
+class ObservableDict(dict):
+    """A dict which records the keys changed since they were last popped. A DictConfig whose value_dict is an
+    ObservableDict reloads only the changed keys instead of comparing all keys.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.__changed_keys = set()
+        self.__cleared = False
+        self.__lock = threading.Lock()
+
+    def __reduce__(self):
+        # pickled or deep copied dicts get a new lock and start with no changed keys
+        return ObservableDict, (dict(self),)
+
+    def __copy__(self):
+        return ObservableDict(self)
+
+    def __record(self, keys):
+        # the dict is always modified before the keys are recorded, so a change is never popped before it is visible
+        with self.__lock:
+            self.__changed_keys.update(keys)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.__record((key,))
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.__record((key,))
+
+    def pop(self, key, *args):
+        ret = dict.pop(self, key, *args)
+        self.__record((key,))
+        return ret
+
+    def popitem(self):
+        ret = dict.popitem(self)
+        self.__record((ret[0],))
+        return ret
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        ret = dict.setdefault(self, key, default)
+        self.__record((key,))
+        return ret
+
+    def update(self, *args, **kwargs):
+        other = dict(*args, **kwargs)
+        dict.update(self, other)
+        self.__record(other)
+
+    def clear(self):
+        dict.clear(self)
+        with self.__lock:
+            self.__cleared = True
+
+    def pop_changed_keys(self):
+        """Returns the keys changed since the last call and starts recording again.
+
+        Returns:
+            set of str: the changed keys, or None if the dict has been cleared and all keys should be compared
+        """
+        with self.__lock:
+            keys = self.__changed_keys
+            cleared = self.__cleared
+            self.__changed_keys = set()
+            self.__cleared = False
+        if cleared:
+            return None
+        return keys
+
+
+class DictConfig(BaseConfig):
+    """Represents a configuration from a dict
+
+    If value_dict is an ObservableDict, only the keys changed since the last reload are compared when reloading. A
+    reload with changes still copies the item dict once, which is O(number of items), so that readers never see a
+    half-applied reload.
 
     Attributes:
         value_dict (dict): a (str, str) dict containing all configurations values.
@@ -379,36 +1324,173 @@ class DictConfig(BaseConfig):
             base_config (BaseConfig): the base configuration
         """
         BaseConfig.__init__(self, name, base_config)
+        self.__observed_dict = None
         if value_dict is None:
-            self.value_dict = dict()
+            self.value_dict = ObservableDict()
         else:
             self.value_dict = value_dict
             self._do_reload()
 
     def _do_reload(self):
+        value_dict = self.value_dict
+        keys = None
+        if isinstance(value_dict, ObservableDict):
+            keys = value_dict.pop_changed_keys()
+            if value_dict is not self.__observed_dict:
+                # value_dict has been replaced, so the recorded keys are not relative to the current items
+                self.__observed_dict = value_dict
+                keys = None
+        if keys is not None and len(keys) == 0:
+            # item_dict is ignored if there is no change
+            self._set_item_dict(None, [])
+            return
         item_dict = self._get_item_dict()
-        _update_from_dict(self.name, item_dict, self.value_dict)
-        self._set_item_dict(item_dict)
+        if keys is None:
+            changes = _update_from_dict(self.name, item_dict, value_dict)
+        else:
+            changes = _update_from_changed_keys(self.name, item_dict, value_dict, keys)
+        self._replace_item_dict(item_dict, changes)
 
+    def _source_memory_usage(self, seen):
+        return _sizeof_deep(self.value_dict, seen)
 
-class IniFileConfig(BaseConfig):
-    """Represents a configuration from an INI file
+
+def _flatten_json(obj, prefix, value_dict):
+    """Flatten nested JSON objects into value_dict, joining nested keys with '.'.
+
+    Args:
+        obj (dict): the JSON object
+        prefix (str): the key of obj, None for the top-level object
+        value_dict (dict): the (str, str) dict to be updated
     """
+    for k, v in obj.iteritems():
+        k = _utf8(k)
+        if prefix is not None:
+            k = prefix + '.' + k
+        if isinstance(v, dict):
+            _flatten_json(v, k, value_dict)
+        elif isinstance(v, list):
+            # the same format as ConfigItem.as_str_list
+            value_dict[k] = ','.join(_json_value_to_str(e) for e in v)
+        else:
+            value_dict[k] = _json_value_to_str(v)
 
-    def __init__(self, filename, base_config=None):
-        """Initialize this configuration
 
+def _json_value_to_str(value):
+    if isinstance(value, basestring):
+        return _utf8(value)
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, (int, long)):
+        return str(value)
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _update_from_json(source, item_dict, filename):
+    """Update item_dict using data from the JSON file. Nested objects are flattened to dotted keys, e.g.
+    {"sec1": {"a": 0}} to sec1.a. Arrays are joined with ','. A missing file is treated as an empty object.
+
+    Args:
+        source (str): the name of source configuration, which is used to create a new ConfigItem.
+        item_dict (dict): the dict to be updated.
+        filename (str): the path to the JSON file
+
+    Returns:
+        list of (str, ConfigItem, ConfigItem): the (key, old_value, new_value) changes made to item_dict
+
+    Raises:
+        ValueError: if the file is not valid JSON or the top-level value is not an object
+    """
+    value_dict = dict()
+    if os.path.exists(filename):
+        with open(filename, 'rb') as f:
+            obj = json.load(f)
+        if not isinstance(obj, dict):
+            raise ValueError('The top-level value of %s should be an object' % filename)
+        _flatten_json(obj, None, value_dict)
+    return _update_from_dict(source, item_dict, value_dict)
+
+
+def _file_fingerprint(filename):
+    """Returns a value which changes when the file is modified, or None if the file does not exist.
+    """
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size, st.st_ino
+
+
+class _FileConfig(BaseConfig):
+    """Base class of configurations from a file. Reloading is skipped if the modification time, size and inode of the
+    file are unchanged. A change which keeps all of them, e.g. rewriting the file within the timestamp resolution of
+    the file system, is only read after invalidate is called.
+    """
+
+    def __init__(self, filename, update_from_file, base_config=None):
+        """
         Args:
-            filename (str): the path to the INI file
+            filename (str): the path to the file
+            update_from_file (callable): called with (source, item_dict, filename), updates item_dict from the file and
+                returns the changes, e.g. _update_from_ini
             base_config (BaseConfig): the base configuration
         """
         BaseConfig.__init__(self, filename, base_config)
+        self.__update_from_file = update_from_file
+        self.__fingerprint = None
         self._do_reload()
 
+    def invalidate(self):
+        """Makes the next reload read the file even if its modification time, size and inode are unchanged.
+        """
+        self.__fingerprint = None
+
     def _do_reload(self):
+        fingerprint = _file_fingerprint(self.name)
+        if fingerprint is not None and fingerprint == self.__fingerprint:
+            # item_dict is ignored if there is no change
+            self._set_item_dict(None, [])
+            return
         item_dict = self._get_item_dict()
-        _update_from_ini(self.name, item_dict, self.name)
-        self._set_item_dict(item_dict)
+        changes = self.__update_from_file(self.name, item_dict, self.name)
+        self._replace_item_dict(item_dict, changes)
+        self.__fingerprint = fingerprint
+
+
+class IniFileConfig(_FileConfig):
+    """Represents a configuration from an INI file
+    """
+
+    def __init__(self, filename, base_config=None):
+        """Initialize this configuration
+
+        Args:
+            filename (str): the path to the INI file
+            base_config (BaseConfig): the base configuration
+        """
+        _FileConfig.__init__(self, filename, _update_from_ini, base_config)
+
+
+class JsonFileConfig(_FileConfig):
+    """Represents a configuration from a JSON file. Nested objects are flattened to dotted keys like the sections of an
+    INI file, e.g. {"sec1": {"a": 0}} to sec1.a.
+    """
+
+    def __init__(self, filename, base_config=None):
+        """Initialize this configuration
+
+        Args:
+            filename (str): the path to the JSON file
+            base_config (BaseConfig): the base configuration
+
+        Raises:
+            ValueError: if the file is not valid JSON or the top-level value is not an object
+        """
+        _FileConfig.__init__(self, filename, _update_from_json, base_config)
 
 
 class SystemEnvConfig(BaseConfig):
@@ -427,5 +1509,976 @@ class SystemEnvConfig(BaseConfig):
 
     def _do_reload(self):
         item_dict = self._get_item_dict()
-        _update_from_dict(self.name, item_dict, os.environ)
-        self._set_item_dict(item_dict)
+        changes = _update_from_dict(self.name, item_dict, os.environ)
+        self._replace_item_dict(item_dict, changes)
+
+
+class CallableConfig(BaseConfig):
+    """Represents a configuration whose values are returned by a loader callable, e.g. secrets or feature flags which
+    are expensive to look up.
+
+    Each value is cached for the TTL of its key, so reload does not call the loader for fresh values. A value is
+    refreshed by a background thread once it is older than refresh_ratio of its TTL, and the cached value is served
+    until the refresh completes. Refreshed values take effect on the next reload. If a refresh fails, the cached value
+    is kept and the refresh is retried on the next reload. If loading a key without a cached value fails, the key is
+    missing until a later reload loads it. The refresh thread does not keep this configuration alive, and it exits
+    when this configuration is closed or garbage collected.
+
+    Usage:
+        config = CallableConfig('secrets', secret_store.get, {'db.password': 300, 'api.token': 60})
+
+    Attributes:
+        loader (callable): called with a key, returns the value(str) of the key, or None if the key does not exist
+        key_ttls (dict): a (str, number) dict mapping each key to load to its TTL in seconds. If the TTL is None,
+            default_ttl is used.
+        default_ttl (int|float): the default TTL in seconds
+        refresh_ratio (float): the fraction of the TTL after which a value is refreshed in the background
+        last_refresh_error (Exception): the last exception raised by the loader, None if there is none
+    """
+
+    def __init__(self, name, loader, key_ttls, default_ttl=60, refresh_ratio=0.8, base_config=None):
+        """Initialize this configuration. The values of all keys are loaded synchronously.
+
+        Args:
+            name (str): the name of this configuration
+            loader (callable): called with a key, returns the value(str) of the key, or None if the key does not exist
+            key_ttls (dict|list): a (str, number) dict mapping each key to its TTL in seconds, or a list of keys using
+                default_ttl.
+            default_ttl (int|float): the default TTL in seconds
+            refresh_ratio (float): the fraction of the TTL after which a value is refreshed in the background
+            base_config (BaseConfig): the base configuration
+
+        Raises:
+            ValueError: if refresh_ratio is not in (0, 1]
+        """
+        if not 0 < refresh_ratio <= 1:
+            raise ValueError('refresh_ratio should be in (0, 1]')
+        BaseConfig.__init__(self, name, base_config)
+        self.loader = loader
+        if isinstance(key_ttls, dict):
+            self.key_ttls = dict(key_ttls)
+        else:
+            self.key_ttls = dict.fromkeys(key_ttls)
+        self.default_ttl = default_ttl
+        self.refresh_ratio = refresh_ratio
+        self.last_refresh_error = None
+        self.__cache = dict()
+        self.__cache_version = 0
+        self.__applied_version = None
+        self.__applied_keys = None
+        self.__refreshing = set()
+        self.__cache_lock = threading.Lock()
+        self.__refresh_queue = None
+        self._do_reload()
+
+    def __load(self, key):
+        value = self.loader(key)
+        with self.__cache_lock:
+            self.__cache[key] = (value, time.time())
+            self.__cache_version += 1
+            self.__refreshing.discard(key)
+
+    def __schedule_refresh(self, key):
+        with self.__cache_lock:
+            if key in self.__refreshing:
+                return
+            self.__refreshing.add(key)
+            if self.__refresh_queue is None:
+                self.__refresh_queue = Queue()
+                queue = self.__refresh_queue
+                # the thread holds a weak reference, which stops it once this configuration is garbage collected
+                config_ref = weakref.ref(self, lambda ref: queue.put(None))
+                thread = threading.Thread(target=CallableConfig.__refresh_loop, args=(config_ref, queue),
+                                          name='CallableConfig refresher: ' + self.name)
+                thread.daemon = True
+                thread.start()
+            self.__refresh_queue.put(key)
+
+    @staticmethod
+    def __refresh_loop(config_ref, queue):
+        while True:
+            key = queue.get()
+            config = config_ref()
+            if key is None or config is None:
+                return
+            try:
+                config.__load(key)
+            except Exception as e:
+                config.last_refresh_error = e
+                with config.__cache_lock:
+                    config.__refreshing.discard(key)
+            # do not keep this configuration alive while waiting
+            config = None
+
+    def close(self):
+        """Stops the background refresh thread. A new one is started if a refresh is needed later.
+        """
+        with self.__cache_lock:
+            if self.__refresh_queue is not None:
+                self.__refresh_queue.put(None)
+                self.__refresh_queue = None
+
+    def _do_reload(self):
+        now = time.time()
+        key_ttls = dict(self.key_ttls)
+        for key, ttl in key_ttls.iteritems():
+            if ttl is None:
+                ttl = self.default_ttl
+            entry = self.__cache.get(key)
+            if entry is None:
+                try:
+                    self.__load(key)
+                except Exception as e:
+                    # the key is loaded again on the next reload
+                    self.last_refresh_error = e
+                continue
+            age = now - entry[1]
+            if age >= ttl and key not in self.__refreshing:
+                try:
+                    self.__load(key)
+                except Exception as e:
+                    # keep serving the cached value
+                    self.last_refresh_error = e
+            elif age >= ttl * self.refresh_ratio:
+                self.__schedule_refresh(key)
+
+        with self.__cache_lock:
+            for key in self.__cache.keys():
+                if key not in key_ttls:
+                    del self.__cache[key]
+            version = self.__cache_version
+            value_dict = dict((k, v[0]) for k, v in self.__cache.iteritems() if v[0] is not None)
+        keys = set(key_ttls)
+        if version == self.__applied_version and keys == self.__applied_keys:
+            # item_dict is ignored if there is no change
+            self._set_item_dict(None, [])
+            return
+        item_dict = self._get_item_dict()
+        changes = _update_from_dict(self.name, item_dict, value_dict)
+        self._replace_item_dict(item_dict, changes)
+        self.__applied_version = version
+        self.__applied_keys = keys
+
+    def _source_memory_usage(self, seen):
+        with self.__cache_lock:
+            cache = dict(self.__cache)
+        return _sizeof_deep(cache, seen)
+
+
+_scheduled_configs = weakref.WeakKeyDictionary()
+_scheduled_configs_lock = threading.Lock()
+
+
+class ReloadScheduler(object):
+    """Reloads a configuration periodically in a background thread. At most one scheduler can run for a configuration.
+
+    Each delay is randomized by jitter, so that processes started together do not reload together. The interval grows
+    by backoff after each reload which changes nothing or fails, up to max_interval, and is reset to min_interval after
+    a reload changes something. If a configuration in the chain changes its items in an unknown way, the items before
+    and after the reload are compared.
+
+    Usage:
+        scheduler = ReloadScheduler(config, 10, max_interval=300)
+        scheduler.start()
+        ...
+        scheduler.stop()
+
+    Attributes:
+        config (BaseConfig): the configuration to reload
+        min_interval (int|float): the minimum interval between reloads in seconds
+        max_interval (int|float): the maximum interval between reloads in seconds
+        jitter (float): the maximum fraction by which each delay is randomly lengthened or shortened
+        backoff (float): the factor by which the interval grows after an unchanged or failed reload
+        interval (int|float): the current interval in seconds
+        next_run_time (float): the time(as returned by time.time()) of the next reload, None if not running
+        reload_count (int): the number of reloads
+        change_count (int): the number of reloads which have changed the configuration
+        error_count (int): the number of reloads which have raised an exception
+        bind_failure_count (int): the number of failures of updating bound attributes
+        last_error (Exception): the exception raised by the last failed reload, None if there is none
+        last_reload_time (float): the time(as returned by time.time()) of the last reload, None if there is none
+    """
+
+    def __init__(self, config, min_interval, max_interval=None, jitter=0.1, backoff=2.0):
+        """Initialize the scheduler
+
+        Args:
+            config (BaseConfig): the configuration to reload
+            min_interval (int|float): the minimum interval between reloads in seconds
+            max_interval (int|float): the maximum interval between reloads in seconds. If it is None, it is 8 times
+                min_interval.
+            jitter (float): the maximum fraction by which each delay is randomly lengthened or shortened
+            backoff (float): the factor by which the interval grows after an unchanged or failed reload
+
+        Raises:
+            ValueError: if an argument is out of range
+        """
+        if max_interval is None:
+            max_interval = min_interval * 8
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError('Invalid interval [%s, %s]' % (min_interval, max_interval))
+        if not 0 <= jitter < 1:
+            raise ValueError('jitter should be in [0, 1)')
+        if backoff < 1:
+            raise ValueError('backoff should not be less than 1')
+        self.config = config
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.backoff = backoff
+        self.interval = min_interval
+        self.next_run_time = None
+        self.reload_count = 0
+        self.change_count = 0
+        self.error_count = 0
+        self.bind_failure_count = 0
+        self.last_error = None
+        self.last_reload_time = None
+        self.__stop_event = None
+        self.__thread = None
+        # whether the last reload reported unknown changes, so the items should be compared
+        self.__compare_items = True
+
+    def start(self):
+        """Starts reloading in a background thread.
+
+        Raises:
+            RuntimeError: if a scheduler is already running for the configuration
+        """
+        with _scheduled_configs_lock:
+            if self.config in _scheduled_configs:
+                raise RuntimeError('A scheduler is already running for ' + self.config.name)
+            _scheduled_configs[self.config] = self
+            self.__stop_event = threading.Event()
+            delay = self.__next_delay()
+            self.next_run_time = time.time() + delay
+            self.__thread = threading.Thread(target=self.__run, args=(self.__stop_event, delay),
+                                             name='ReloadScheduler: ' + self.config.name)
+            self.__thread.daemon = True
+            self.__thread.start()
+
+    def stop(self, timeout=None):
+        """Stops reloading and waits for the background thread to exit.
+
+        Args:
+            timeout (int|float): the maximum time to wait in seconds. If it is None, wait until the thread exits.
+        """
+        with _scheduled_configs_lock:
+            if self.__thread is None:
+                return
+            if _scheduled_configs.get(self.config) is self:
+                del _scheduled_configs[self.config]
+            thread = self.__thread
+            self.__stop_event.set()
+            self.__thread = None
+            self.__stop_event = None
+        thread.join(timeout)
+        self.next_run_time = None
+
+    def __next_delay(self):
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def __run(self, stop_event, delay):
+        while not stop_event.wait(delay):
+            self.run_once()
+            delay = self.__next_delay()
+            self.next_run_time = time.time() + delay
+
+    def run_once(self):
+        """Reloads the configuration and adjusts the interval.
+        """
+        changed_keys = []
+        listener = lambda config, keys: changed_keys.append(keys)
+        items = self.__items() if self.__compare_items else None
+        self.config.add_listener(listener)
+        try:
+            bind_failure = self.config.reload()
+        except Exception as e:
+            self.error_count += 1
+            self.last_error = e
+            changed = False
+        else:
+            if bind_failure is not None:
+                self.bind_failure_count += len(bind_failure)
+            changed = self.__changed(changed_keys, items)
+            if changed:
+                self.change_count += 1
+        finally:
+            self.config.remove_listener(listener)
+        self.reload_count += 1
+        self.last_reload_time = time.time()
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+    def __items(self):
+        # always compare the current items, even if they are pinned in this thread
+        token = _set_pin(None)
+        try:
+            return dict(self.config.items())
+        except ValueError:
+            # a reference can not be resolved
+            return None
+        finally:
+            _reset_pin(token)
+
+    def __changed(self, changed_keys, items):
+        """Returns whether the reload has changed the configuration.
+
+        Args:
+            changed_keys (list of set of str): the keys passed to the listener during the reload
+            items (dict): the items before the reload, None if they were not recorded or could not be resolved
+        """
+        if None not in changed_keys:
+            self.__compare_items = False
+            return any(len(keys) > 0 for keys in changed_keys)
+        # the changes are unknown, e.g. a BaseConfig without _do_reload, so compare the items
+        self.__compare_items = True
+        if items is None:
+            return True
+        return self.__items() != items
+
+
+_FRAME_HEADER = struct.Struct('!I')
+
+_RESYNC_REQUEST = 'R'
+
+
+def _encode_message(message):
+    # strings are sent as Latin-1, which maps every byte to a code point, so values in any encoding survive
+    data = json.dumps(message, separators=(',', ':'), encoding='latin-1')
+    return _FRAME_HEADER.pack(len(data)) + data
+
+
+def _latin1(value):
+    """Returns the original bytes of a string decoded from a message.
+    """
+    if isinstance(value, unicode):
+        return value.encode('latin-1')
+    return value
+
+
+def _utf8(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+class _PublisherClient(object):
+    """A subscriber connected to a ConfigPublisher.
+
+    Attributes:
+        sock (socket): the connection to the subscriber
+        messages (deque): the encoded messages to send
+        offset (int): the number of bytes of the first message which have been sent
+        resync (bool): whether a full snapshot should be sent instead of the pending patches
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.messages = deque()
+        self.offset = 0
+        self.resync = True
+
+
+class ConfigPublisher(object):
+    """Broadcasts the changes of a configuration to SubscriberConfig objects in other processes over a Unix socket, so
+    that the subscribers do not need to reload and parse the sources themselves.
+
+    After each reload, the changed items of the configuration(as read by config.get) are sent to all subscribers as a
+    patch. A newly connected subscriber, a subscriber which has missed a patch and a subscriber which is too slow to
+    receive max_pending patches get a full snapshot instead.
+
+    Usage:
+        publisher = ConfigPublisher(config, '/var/run/myapp/config.sock')
+        publisher.start()
+        ...
+        config.reload()  # the changes are sent to all subscribers
+        ...
+        publisher.stop()
+
+    Attributes:
+        config (BaseConfig): the configuration to publish
+        address (str): the path of the Unix socket
+        max_pending (int): the maximum number of patches queued for a subscriber before it gets a full snapshot
+        generation (int): the number of patches published
+    """
+
+    def __init__(self, config, address, max_pending=1000):
+        """Initialize the publisher
+
+        Args:
+            config (BaseConfig): the configuration to publish
+            address (str): the path of the Unix socket
+            max_pending (int): the maximum number of patches queued for a subscriber before it gets a full snapshot
+        """
+        self.config = config
+        self.address = address
+        self.max_pending = max_pending
+        self.generation = 0
+        self.__published = dict()
+        self.__clients = []
+        self.__lock = threading.Lock()
+        self.__server = None
+        self.__wakeup = None
+        self.__thread = None
+
+    def __get(self, key):
+        try:
+            item = self.config.get(key)
+        except ValueError:
+            # the reference can not be resolved
+            return None
+        if item is None:
+            return None
+        return item, item.source
+
+    def start(self):
+        """Starts listening on the Unix socket and publishing the changes.
+        """
+        if os.path.exists(self.address) and stat.S_ISSOCK(os.stat(self.address).st_mode):
+            os.unlink(self.address)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.address)
+        server.listen(16)
+        server.setblocking(False)
+        with self.__lock:
+            self.__server = server
+            self.__wakeup = socket.socketpair()
+            for sock in self.__wakeup:
+                sock.setblocking(False)
+            self.__published = None
+        # listen before taking the snapshot, so a reload in between is not missed
+        self.config.add_listener(self.__on_change)
+        with self.__lock:
+            published = dict()
+            token = _set_pin(None)
+            try:
+                for key in self.config.keys():
+                    value = self.__get(key)
+                    if value is not None:
+                        published[key] = value
+            finally:
+                _reset_pin(token)
+            self.__published = published
+        self.__thread = threading.Thread(target=self.__run, name='ConfigPublisher: ' + self.address)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """Stops publishing, disconnects all subscribers and removes the Unix socket.
+        """
+        if self.__thread is None:
+            return
+        self.config.remove_listener(self.__on_change)
+        with self.__lock:
+            server = self.__server
+            self.__server = None
+            self.__wake()
+        self.__thread.join()
+        self.__thread = None
+        for client in self.__clients:
+            client.sock.close()
+        self.__clients = []
+        server.close()
+        for sock in self.__wakeup:
+            sock.close()
+        self.__wakeup = None
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def __on_change(self, config, keys):
+        with self.__lock:
+            if self.__server is None or self.__published is None:
+                # the snapshot taken after this reload includes its changes
+                return
+            published = self.__published
+            # always publish the current items, even if they are pinned in this thread
+            token = _set_pin(None)
+            try:
+                if keys is None:
+                    keys = set(published) | set(self.config.keys())
+                changes = []
+                for key in keys:
+                    value = self.__get(key)
+                    old_value = published.get(key)
+                    if value == old_value:
+                        continue
+                    if value is None:
+                        del published[key]
+                        changes.append((key, None, None))
+                    else:
+                        published[key] = value
+                        changes.append((key, value[0], value[1]))
+            finally:
+                _reset_pin(token)
+            if len(changes) == 0:
+                return
+            self.generation += 1
+            data = _encode_message({'type': 'patch', 'generation': self.generation, 'changes': changes})
+            for client in self.__clients:
+                if client.resync:
+                    continue
+                client.messages.append(data)
+                if len(client.messages) > self.max_pending:
+                    self.__drop_pending(client)
+            self.__wake()
+
+    def __wake(self):
+        try:
+            self.__wakeup[1].send('x')
+        except socket.error as e:
+            # the socket buffer is full, so the thread will wake up anyway
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    @staticmethod
+    def __drop_pending(client):
+        """Drops the pending patches of the client, which will get a full snapshot instead. The partially sent message
+        is kept to keep the stream framed.
+        """
+        head = client.messages[0] if client.offset > 0 else None
+        client.messages.clear()
+        if head is not None:
+            client.messages.append(head)
+        client.resync = True
+
+    def __enqueue_snapshot(self, client):
+        items = [(k, v[0], v[1]) for k, v in self.__published.iteritems()]
+        client.messages.append(_encode_message({'type': 'full', 'generation': self.generation, 'items': items}))
+        client.resync = False
+
+    def __run(self):
+        while True:
+            with self.__lock:
+                server = self.__server
+                if server is None:
+                    return
+                for client in self.__clients:
+                    if client.resync and len(client.messages) == 0:
+                        self.__enqueue_snapshot(client)
+                writers = [client.sock for client in self.__clients if len(client.messages) > 0]
+            readers = [server, self.__wakeup[0]] + [client.sock for client in self.__clients]
+            readable, writable, _ = select.select(readers, writers, [])
+            if self.__wakeup[0] in readable:
+                self.__wakeup[0].recv(4096)
+            if server in readable:
+                self.__accept(server)
+            for client in list(self.__clients):
+                try:
+                    if client.sock in readable:
+                        self.__receive(client)
+                    if client.sock in writable:
+                        self.__send(client)
+                except socket.error:
+                    self.__disconnect(client)
+
+    def __accept(self, server):
+        try:
+            sock, _ = server.accept()
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+        sock.setblocking(False)
+        with self.__lock:
+            self.__clients.append(_PublisherClient(sock))
+
+    def __disconnect(self, client):
+        with self.__lock:
+            self.__clients.remove(client)
+        client.sock.close()
+
+    def __receive(self, client):
+        data = client.sock.recv(4096)
+        if len(data) == 0:
+            self.__disconnect(client)
+        elif _RESYNC_REQUEST in data:
+            with self.__lock:
+                self.__drop_pending(client)
+
+    def __send(self, client):
+        # the socket is non-blocking, so the lock is held briefly even though it covers the send
+        with self.__lock:
+            if len(client.messages) == 0:
+                return
+            data = client.messages[0]
+            try:
+                sent = client.sock.send(buffer(data, client.offset))
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+            client.offset += sent
+            if client.offset == len(data):
+                client.messages.popleft()
+                client.offset = 0
+
+
+class SubscriberConfig(BaseConfig):
+    """Represents a configuration received from a ConfigPublisher in another process.
+
+    A background thread receives the changes and applies them to this configuration, without reloading its base
+    configurations, and updates the attributes bound to this configuration. Configurations based on it see the changes
+    immediately, but their bound attributes are updated when they are reloaded. If the connection is lost or a message
+    can not be applied, the thread reconnects every retry_interval seconds and the subscriber gets a full snapshot.
+
+    Usage:
+        config = DictConfig('hotfix', base_config=SubscriberConfig('/var/run/myapp/config.sock'))
+
+    Attributes:
+        address (str): the path of the Unix socket of the publisher
+        retry_interval (int|float): the interval between reconnections in seconds
+        publisher_generation (int): the generation of the last applied patch or snapshot, None if there is none
+        last_error (Exception): the last error that broke the connection, None if there is none
+    """
+
+    def __init__(self, address, base_config=None, retry_interval=1):
+        """Initialize this configuration and starts receiving in a background thread.
+
+        Args:
+            address (str): the path of the Unix socket of the publisher
+            base_config (BaseConfig): the base configuration
+            retry_interval (int|float): the interval between reconnections in seconds
+        """
+        BaseConfig.__init__(self, 'Subscriber ' + address, base_config)
+        self.address = address
+        self.retry_interval = retry_interval
+        self.publisher_generation = None
+        self.last_error = None
+        self.__pending = deque()
+        self.__closed = threading.Event()
+        self.__sock = None
+        self.__thread = threading.Thread(target=self.__run, name='SubscriberConfig: ' + address)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def close(self):
+        """Disconnects from the publisher and stops the background thread.
+        """
+        self.__closed.set()
+        sock = self.__sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        self.__thread.join()
+
+    def __run(self):
+        while not self.__closed.is_set():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.address)
+                self.__sock = sock
+                if self.__closed.is_set():
+                    break
+                self.__receive(sock)
+            except Exception as e:
+                # a malformed message or a failed reload is recovered by the full snapshot after reconnecting
+                self.last_error = e
+                self.__pending.clear()
+            finally:
+                self.__sock = None
+                sock.close()
+            self.__closed.wait(self.retry_interval)
+
+    def __receive(self, sock):
+        data = ''
+        generation = None
+        resync_requested = False
+        while True:
+            chunk = sock.recv(65536)
+            if len(chunk) == 0:
+                return
+            data += chunk
+            received = False
+            while len(data) >= _FRAME_HEADER.size:
+                size = _FRAME_HEADER.unpack_from(data)[0]
+                end = _FRAME_HEADER.size + size
+                if len(data) < end:
+                    break
+                message = json.loads(data[_FRAME_HEADER.size:end])
+                data = data[end:]
+                if message['type'] == 'full':
+                    resync_requested = False
+                elif resync_requested:
+                    continue
+                elif generation is None or message['generation'] != generation + 1:
+                    # a patch has been missed
+                    sock.sendall(_RESYNC_REQUEST)
+                    resync_requested = True
+                    continue
+                self.__pending.append(message)
+                generation = message['generation']
+                received = True
+            if received:
+                self._reload_layer()
+
+    def _do_reload(self):
+        if len(self.__pending) == 0:
+            # item_dict is ignored if there is no change
+            self._set_item_dict(None, [])
+            return
+        item_dict = self._get_item_dict()
+        now = datetime.now()
+        changes = []
+        while len(self.__pending) > 0:
+            message = self.__pending.popleft()
+            if message['type'] == 'full':
+                keys = set()
+                for k, v, source in message['items']:
+                    k = _latin1(k)
+                    keys.add(k)
+                    _update_item(_latin1(source), item_dict, k, _latin1(v), now, changes)
+                _remove_missing_items(item_dict, keys, changes)
+            else:
+                for k, v, source in message['changes']:
+                    k = _latin1(k)
+                    if v is not None:
+                        _update_item(_latin1(source), item_dict, k, _latin1(v), now, changes)
+                    elif k in item_dict:
+                        changes.append((k, item_dict.pop(k), None))
+        self._replace_item_dict(item_dict, changes)
+        self.publisher_generation = message['generation']
+
+    def _source_memory_usage(self, seen):
+        return _sizeof_deep(self.__pending, seen)
+
+
+_DIGEST_MODULUS = 1 << 256
+
+
+def _digest_int(data):
+    return int(hashlib.sha256(data).hexdigest(), 16)
+
+
+def _digest_hex(value):
+    return '%064x' % value
+
+
+class _DigestNode(object):
+    """A section of a ConfigDigest.
+
+    Attributes:
+        children (dict): a (str, _DigestNode) dict mapping the paths of the subsections to their nodes
+        leaves (dict): a (str, int) dict mapping the keys directly in this section to the digests of their items
+        total (int): the sum of the digests of all children and leaves modulo 2^256, which is the digest of this node
+    """
+
+    __slots__ = ('children', 'leaves', 'total')
+
+    def __init__(self):
+        self.children = dict()
+        self.leaves = dict()
+        self.total = 0
+
+
+class ConfigDigest(object):
+    """A hierarchical digest of the items of a configuration(as read by config.get), for checking that many processes
+    have loaded the same configuration.
+
+    The keys are organized as a tree of dot-separated sections, e.g. db.pool.size is in section db.pool, which is in
+    section db. The digest of a section combines the digests of its keys and subsections by addition modulo 2^256, so
+    a reload updates only the sections containing the changed keys. Comparing the root digests tells whether two
+    configurations are the same, and comparing the digests of the subsections where they differ finds the differing
+    keys.
+
+    Usage:
+        digest = ConfigDigest(config)
+        if digest.digest() != remote.digest():
+            differing_keys = digest.diff(remote)
+
+    Attributes:
+        config (BaseConfig): the configuration to digest
+    """
+
+    def __init__(self, config):
+        """Initialize the digest and starts listening to the changes of the configuration.
+
+        Args:
+            config (BaseConfig): the configuration to digest
+        """
+        self.config = config
+        self.__root = _DigestNode()
+        self.__pending_keys = set()
+        self.__rebuild = True
+        self.__lock = threading.Lock()
+        config.add_listener(self.__on_change)
+
+    def close(self):
+        """Stops listening to the changes of the configuration.
+        """
+        self.config.remove_listener(self.__on_change)
+
+    def __on_change(self, config, keys):
+        with self.__lock:
+            if keys is None:
+                self.__rebuild = True
+                self.__pending_keys = set()
+            elif not self.__rebuild:
+                self.__pending_keys.update(keys)
+
+    def __get(self, key):
+        try:
+            return self.config.get(key)
+        except ValueError:
+            # the reference can not be resolved
+            return None
+
+    def __apply_pending(self):
+        """Applies the pending changes. Must be called with the lock held.
+        """
+        if not self.__rebuild and len(self.__pending_keys) == 0:
+            return
+        # always digest the current items, even if they are pinned in this thread
+        token = _set_pin(None)
+        try:
+            if self.__rebuild:
+                self.__rebuild = False
+                self.__pending_keys = set()
+                self.__root = _DigestNode()
+                keys = self.config.keys()
+            else:
+                keys = self.__pending_keys
+                self.__pending_keys = set()
+            for key in keys:
+                self.__update(key, self.__get(key))
+        finally:
+            _reset_pin(token)
+
+    def __update(self, key, value):
+        parts = key.split('.')
+        paths = ['.'.join(parts[:i + 1]) for i in range(0, len(parts) - 1)]
+        nodes = [self.__root]
+        old_totals = [self.__root.total]
+        for path in paths:
+            node = nodes[-1].children.get(path)
+            if node is None:
+                if value is None:
+                    return
+                node = _DigestNode()
+                nodes[-1].children[path] = node
+                old_totals.append(None)
+            else:
+                old_totals.append(node.total)
+            nodes.append(node)
+
+        node = nodes[-1]
+        old_leaf = node.leaves.get(key)
+        if value is None:
+            if old_leaf is None:
+                return
+            del node.leaves[key]
+            node.total -= old_leaf
+        else:
+            new_leaf = _digest_int('L' + key + '\0' + value)
+            if new_leaf == old_leaf:
+                return
+            node.leaves[key] = new_leaf
+            node.total += new_leaf - (0 if old_leaf is None else old_leaf)
+        node.total %= _DIGEST_MODULUS
+
+        for i in range(len(nodes) - 1, 0, -1):
+            node = nodes[i]
+            parent = nodes[i - 1]
+            path = paths[i - 1]
+            if old_totals[i] is not None:
+                parent.total -= _digest_int('N' + path + '\0' + _digest_hex(old_totals[i]))
+            if len(node.children) == 0 and len(node.leaves) == 0:
+                del parent.children[path]
+            else:
+                parent.total += _digest_int('N' + path + '\0' + _digest_hex(node.total))
+            parent.total %= _DIGEST_MODULUS
+
+    def __node(self, path):
+        node = self.__root
+        if path == '':
+            return node
+        parts = path.split('.')
+        for i in range(0, len(parts)):
+            node = node.children.get('.'.join(parts[:i + 1]))
+            if node is None:
+                raise KeyError('No such section ' + path)
+        return node
+
+    def digest(self, path=''):
+        """Returns the digest of a section.
+
+        Args:
+            path (str): the path of the section, '' for the root
+
+        Returns:
+            str: the hex digest of the section
+
+        Raises:
+            KeyError: if there is no such section
+        """
+        with self.__lock:
+            self.__apply_pending()
+            return _digest_hex(self.__node(path).total)
+
+    def children(self, path=''):
+        """Returns the digests of the subsections of a section.
+
+        Args:
+            path (str): the path of the section, '' for the root
+
+        Returns:
+            dict: a (str, str) dict mapping the paths of the subsections to their hex digests
+
+        Raises:
+            KeyError: if there is no such section
+        """
+        with self.__lock:
+            self.__apply_pending()
+            return dict((k, _digest_hex(v.total)) for k, v in self.__node(path).children.iteritems())
+
+    def leaves(self, path=''):
+        """Returns the digests of the items directly in a section.
+
+        Args:
+            path (str): the path of the section, '' for the root
+
+        Returns:
+            dict: a (str, str) dict mapping the keys directly in the section to the hex digests of their items
+
+        Raises:
+            KeyError: if there is no such section
+        """
+        with self.__lock:
+            self.__apply_pending()
+            return dict((k, _digest_hex(v)) for k, v in self.__node(path).leaves.iteritems())
+
+    def diff(self, other):
+        """Returns the keys whose items differ from another digest, walking down only the sections whose digests
+        differ.
+
+        Args:
+            other (object): the other digest, which can be any object with the digest, children and leaves methods of
+                ConfigDigest, e.g. a proxy of a ConfigDigest in another process
+
+        Returns:
+            list of str: the sorted keys which exist in only one digest or have different items
+        """
+        ret = []
+        self.__diff(self, other, '', ret)
+        return sorted(ret)
+
+    @classmethod
+    def __diff(cls, a, b, path, ret):
+        if a is not None and b is not None and a.digest(path) == b.digest(path):
+            return
+        a_leaves = a.leaves(path) if a is not None else dict()
+        b_leaves = b.leaves(path) if b is not None else dict()
+        for key in set(a_leaves) | set(b_leaves):
+            if a_leaves.get(key) != b_leaves.get(key):
+                ret.append(key)
+        a_children = a.children(path) if a is not None else dict()
+        b_children = b.children(path) if b is not None else dict()
+        for child in set(a_children) | set(b_children):
+            a_digest = a_children.get(child)
+            b_digest = b_children.get(child)
+            if a_digest != b_digest:
+                cls.__diff(a if a_digest is not None else None, b if b_digest is not None else None, child, ret)
@@ -1,13 +1,23 @@
 import os
+import shutil
+import socket
+import struct
 import tempfile
+import threading
 import unittest
+import weakref
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import collections
+import copy
+import gc
+import pickle
+import time
 
 import test_utils
-from gaia_config import ConfigItem, BaseConfig, DictConfig, IniFileConfig
+from gaia_config import ConfigItem, ConfigHistory, BaseConfig, CallableConfig, ConfigDigest, ConfigPublisher, \
+    DictConfig, IniFileConfig, JsonFileConfig, ObservableDict, ReloadScheduler, SubscriberConfig
 
 
 class TestConfigItem(test_utils.ConcurrentTestCase):
@@ -84,6 +94,10 @@ class Empty:
     pass
 
 
+class Slotted(object):
+    __slots__ = ('x',)
+
+
 class TestBaseConfig(unittest.TestCase):
     def setUp(self):
         self.base_dict = {'k': 'v', 'k1': 'v'}
@@ -115,6 +129,36 @@ class TestBaseConfig(unittest.TestCase):
         self.assertEqual(self.config['k2'], "v2")
         self.assertEqual(self.config['k3'], "v3")
 
+    def test_get(self):
+        self.assertEqual(self.config.get('k'), 'v')
+        self.assertEqual(self.config.get('k1'), 'v1')
+        self.assertIsNone(self.config.get('x'))
+        self.assertEqual(self.config.get('x', 'y'), 'y')
+
+    def test_get_negative_cache(self):
+        self.assertIsNone(self.config.get('x'))
+        self.assertIn('x', self.config._BaseConfig__missing_keys)
+        self.base_dict['x'] = 'y'
+        self.config.reload()
+        self.assertNotIn('x', self.config._BaseConfig__missing_keys)
+        self.assertEqual(self.config.get('x'), 'y')
+
+    def test_get_negative_cache_reload_base_config(self):
+        self.assertRaises(KeyError, self.config.__getitem__, 'x')
+        self.base_dict['x'] = 'y'
+        self.base_config.reload()
+        self.assertEqual(self.config['x'], 'y')
+
+    def test_get_as(self):
+        self.base_dict['x'] = '1234'
+        self.config.reload()
+        self.assertEqual(self.config.get_as('x', 'as_int'), 1234)
+        self.assertEqual(self.config.get_as('y', 'as_int', 4321), 4321)
+        self.assertRaises(ValueError, self.config.get_as, 'k', 'as_int')
+        self.assertRaises(TypeError, self.config.get_as, 'x', 1)
+        self.assertRaises(TypeError, self.config.get_as, 'x', None)
+        self.assertRaises(TypeError, self.config.get_as, 'y', None)
+
     def test_keys(self):
         self.assertEqual(collections.Counter(self.config.keys()), collections.Counter(['k', 'k1', 'k2', 'k3']))
 
@@ -131,6 +175,13 @@ class TestBaseConfig(unittest.TestCase):
         self.assertEqual(collections.Counter(self.config.items()),
                          collections.Counter([('k1', 'v1'), ('k2', 'v2'), ('k3', 'v3')]))
 
+    def test_replace_item_dict(self):
+        item_dict = self.config._get_item_dict()
+        item_dict.pop('k1')
+        self.config._replace_item_dict(item_dict)
+        self.assertIs(self.config._BaseConfig__item_dict, item_dict)
+        self.assertEqual(self.config['k1'], 'v')
+
     def test_copy(self):
         config = self.config.copy()
         self.assertEqual(self.config.name, config.name)
@@ -243,6 +294,47 @@ class TestBaseConfig(unittest.TestCase):
         self.config.bind('k', obj, 'k')
         self.assertRaises(KeyError, self.config.unbind_one, 'k', obj, 'k1')
 
+    def test_bind_weak_reference(self):
+        obj = Empty()
+        self.config.bind('k', obj, 'k')
+        del obj
+        gc.collect()
+        self.config.reload()
+        self.assertEqual(self.config._BaseConfig__bind_dict, dict())
+
+    def test_bind_no_weak_reference(self):
+        obj = Slotted()
+        self.config.bind('k', obj, 'x')
+        self.assertEqual(obj.x, 'v')
+        self.config.unbind_one('k', obj, 'x')
+        self.assertIsNone(obj.x)
+
+    def test_bind_same_attribute_twice(self):
+        obj = Empty()
+        self.config.bind('k', obj, 'k')
+        self.config.bind('k', obj, 'k', 'as_str_list')
+        self.assertEqual(obj.k, ['v'])
+        self.assertEqual(len(self.config._BaseConfig__bind_dict['k']), 1)
+
+    def test_bind_many(self):
+        obj = Empty()
+        self.base_dict['x'] = '1234'
+        self.base_config.reload()
+        bind_failure = self.config.bind_many([('k1', obj, 'k1'), ('x', obj, 'x', 'as_int'),
+                                              ('y', obj, 'y', 'as_int', 4321), ('k', obj, 'k', 'as_int')])
+        self.assertEqual(len(bind_failure), 1)
+        self.assertEqual(obj.k1, 'v1')
+        self.assertEqual(obj.x, 1234)
+        self.assertEqual(obj.y, 4321)
+        self.base_dict['y'] = '1'
+        self.config.reload()
+        self.assertEqual(obj.y, 1)
+
+    def test_bind_many_invalid_method(self):
+        obj = Empty()
+        self.assertRaises(TypeError, self.config.bind_many, [('k1', obj, 'k1'), ('k', obj, 'k', 1)])
+        self.assertFalse(hasattr(obj, 'k1'))
+
     def test_reload(self):
         self.base_dict['kk'] = 'vv'
         self.config._do_reload = lambda: self.dict.pop('k1', None)
@@ -362,6 +454,760 @@ class TestDictConfig(unittest.TestCase):
         self.assertEqual('y', self.config['x'])
 
 
+class TestConfigHistory(unittest.TestCase):
+    def setUp(self):
+        self.base_dict = {'a.x': '0', 'b.y': '1'}
+        self.dict = {'a.z': '2'}
+        self.config = DictConfig('test', self.dict, DictConfig('base', self.base_dict))
+        self.history = ConfigHistory()
+        self.config.set_history(self.history)
+
+    def test_record_reload(self):
+        self.base_dict['a.x'] = '1'
+        del self.base_dict['b.y']
+        self.dict['a.w'] = '3'
+        self.config.reload()
+        changes = self.history.query()
+        self.assertEqual([(c.key, c.old_value, c.new_value, c.source) for c in changes],
+                         [('a.x', '0', '1', 'base'), ('b.y', '1', None, 'base'), ('a.w', None, '3', 'test')])
+        self.assertEqual(changes[0].generation, self.config.base_config.generation)
+        self.assertEqual(changes[2].generation, self.config.generation)
+
+    def test_unchanged_reload(self):
+        generation = self.config.generation
+        self.config.reload()
+        self.assertEqual(len(self.history), 0)
+        self.assertEqual(self.config.generation, generation)
+
+    def test_query(self):
+        self.base_dict['a.x'] = '1'
+        self.base_dict['b.y'] = '2'
+        self.config.reload()
+        middle = datetime.now()
+        self.base_dict['a.x'] = '2'
+        self.config.reload()
+        self.assertEqual([c.new_value for c in self.history.query(key='a.x')], ['1', '2'])
+        self.assertEqual([c.key for c in self.history.query(prefix='b.')], ['b.y'])
+        self.assertEqual([c.new_value for c in self.history.query(start_time=middle)], ['2'])
+        self.assertEqual(sorted(c.new_value for c in self.history.query(end_time=middle)), ['1', '2'])
+
+    def test_max_size(self):
+        self.history = ConfigHistory(max_size=2)
+        self.config.set_history(self.history)
+        for i in range(0, 5):
+            self.dict['a.z'] = str(i + 10)
+            self.config.reload()
+        self.assertEqual([c.new_value for c in self.history.query()], ['13', '14'])
+
+    def test_max_age(self):
+        self.history = ConfigHistory(max_age=timedelta(hours=1))
+        self.history.record('test', 1, [('k', None, 'v')], datetime.now() - timedelta(hours=2))
+        self.history.record('test', 2, [('k', 'v', 'v2')])
+        self.assertEqual([c.generation for c in self.history.query()], [2])
+
+    def test_unordered_timestamps(self):
+        self.history = ConfigHistory(max_age=timedelta(hours=1))
+        now = datetime.now()
+        self.history.record('test', 1, [('k', None, 'v')], now)
+        self.history.record('test', 2, [('k', 'v', 'v2')], now - timedelta(minutes=1))
+        self.history.record('test', 3, [('k', 'v2', 'v3')], now - timedelta(hours=2))
+        self.assertEqual([c.generation for c in self.history.query(end_time=now)], [2])
+        self.assertEqual([c.generation for c in self.history.query()], [1, 2])
+
+    def test_disable(self):
+        self.config.set_history(None)
+        self.dict['a.z'] = '3'
+        self.config.reload()
+        self.assertEqual(len(self.history), 0)
+
+
+class TestInterpolation(unittest.TestCase):
+    def setUp(self):
+        self.base_dict = {'paths.root': '/srv', 'paths.data': '${paths.root}/data', 'paths.log': '${paths.root}/log',
+                          'name': 'app'}
+        self.base_config = DictConfig('base', self.base_dict)
+        self.dict = {'paths.cache': '${paths.data}/${name}'}
+        self.config = DictConfig('test', self.dict, self.base_config)
+        self.config.set_interpolation()
+
+    def test___getitem__(self):
+        self.assertEqual(self.config['paths.data'], '/srv/data')
+        self.assertEqual(self.config['paths.cache'], '/srv/data/app')
+        self.assertEqual(self.config['paths.cache'].source, 'test')
+        self.assertEqual(self.config['name'], 'app')
+        self.assertEqual(self.base_config['paths.data'], '${paths.root}/data')
+
+    def test_override_in_derived_config(self):
+        self.dict['paths.root'] = '/opt'
+        self.config.reload()
+        self.assertEqual(self.config['paths.cache'], '/opt/data/app')
+        self.assertEqual(self.base_config['paths.root'], '/srv')
+
+    def test_memoized(self):
+        self.assertIs(self.config['paths.cache'], self.config['paths.cache'])
+
+    def test_reload_invalidates_dependents_only(self):
+        log = self.config['paths.log']
+        cache = self.config['paths.cache']
+        self.base_dict['name'] = 'app2'
+        self.config.reload()
+        self.assertIs(self.config['paths.log'], log)
+        self.assertEqual(self.config['paths.cache'], '/srv/data/app2')
+        self.base_dict['paths.root'] = '/opt'
+        self.config.reload()
+        self.assertEqual(self.config['paths.log'], '/opt/log')
+        self.assertEqual(self.config['paths.cache'], '/opt/data/app2')
+        self.assertIsNot(self.config['paths.cache'], cache)
+
+    def test_reload_base_config(self):
+        self.assertEqual(self.config['paths.data'], '/srv/data')
+        self.base_dict['paths.root'] = '/opt'
+        self.base_config.reload()
+        self.assertEqual(self.config['paths.data'], '/opt/data')
+
+    def test_circular_reference(self):
+        self.dict['a'] = '${b}'
+        self.dict['b'] = 'x${a}'
+        self.config.reload()
+        self.assertRaises(ValueError, self.config.__getitem__, 'a')
+
+    def test_unresolved_reference(self):
+        self.dict['a'] = '${no_such_key}'
+        self.config.reload()
+        self.assertRaises(ValueError, self.config.__getitem__, 'a')
+        self.dict['no_such_key'] = 'x'
+        self.config.reload()
+        self.assertEqual(self.config['a'], 'x')
+
+    def test_items(self):
+        self.assertEqual(dict(self.config.items())['paths.cache'], '/srv/data/app')
+
+    def test_bind(self):
+        obj = Empty()
+        self.config.bind('paths.cache', obj, 'cache')
+        self.assertEqual(obj.cache, '/srv/data/app')
+        self.base_dict['paths.root'] = '/opt'
+        self.config.reload()
+        self.assertEqual(obj.cache, '/opt/data/app')
+
+    def test_copy(self):
+        config = self.config.copy()
+        self.base_dict['paths.root'] = '/opt'
+        self.config.reload()
+        self.assertEqual(config['paths.data'], '/srv/data')
+
+    def test_disable(self):
+        self.config.set_interpolation(False)
+        self.assertEqual(self.config['paths.data'], '${paths.root}/data')
+
+
+class TestObservableDictConfig(unittest.TestCase):
+    def setUp(self):
+        self.dict = ObservableDict({'k': 'v', 'k1': 'v1', 'k2': 'v2'})
+        self.config = DictConfig('test', self.dict)
+
+    def test___init__(self):
+        self.assertEqual(collections.Counter(self.config.items()),
+                         collections.Counter([('k', 'v'), ('k1', 'v1'), ('k2', 'v2')]))
+        self.assertIsInstance(DictConfig('test').value_dict, ObservableDict)
+
+    def test_reload(self):
+        self.dict['k'] = 'x'
+        del self.dict['k1']
+        self.dict.update(k3='v3')
+        self.dict.pop('k2')
+        self.dict.setdefault('k4', 'v4')
+        self.config.reload()
+        self.assertEqual(collections.Counter(self.config.items()),
+                         collections.Counter([('k', 'x'), ('k3', 'v3'), ('k4', 'v4')]))
+
+    def test_copy(self):
+        self.dict['k'] = 'x'
+        for other in (copy.copy(self.dict), copy.deepcopy(self.dict), pickle.loads(pickle.dumps(self.dict))):
+            self.assertIsInstance(other, ObservableDict)
+            self.assertEqual(other, self.dict)
+            self.assertEqual(other.pop_changed_keys(), set())
+            other['k1'] = 'x1'
+            self.assertEqual(other.pop_changed_keys(), {'k1'})
+        self.assertEqual(self.dict.pop_changed_keys(), {'k'})
+
+    def test_reload_changed_keys_only(self):
+        dict.__setitem__(self.dict, 'k', 'x')
+        self.dict['k1'] = 'x1'
+        self.config.reload()
+        self.assertEqual(self.config['k'], 'v')
+        self.assertEqual(self.config['k1'], 'x1')
+
+    def test_reload_unchanged(self):
+        generation = self.config.generation
+        self.dict['k'] = 'v'
+        self.config.reload()
+        self.config.reload()
+        self.assertEqual(self.config.generation, generation)
+
+    def test_reload_clear(self):
+        self.dict.clear()
+        self.dict['x'] = 'y'
+        self.config.reload()
+        self.assertEqual(self.config.items(), [('x', 'y')])
+
+    def test_reload_replaced_dict(self):
+        self.config.value_dict = ObservableDict({'x': 'y'})
+        self.config.reload()
+        self.assertEqual(self.config.items(), [('x', 'y')])
+
+
+class TestCallableConfig(unittest.TestCase):
+    def setUp(self):
+        self.values = {'a': '0', 'b': '1'}
+        self.calls = collections.Counter()
+
+        def loader(key):
+            self.calls[key] += 1
+            return self.values.get(key)
+
+        self.config = CallableConfig('test', loader, {'a': 10, 'b': None, 'c': None}, default_ttl=60,
+                                     refresh_ratio=0.5)
+
+    def tearDown(self):
+        self.config.close()
+
+    def age(self, key, seconds):
+        cache = self.config._CallableConfig__cache
+        value, load_time = cache[key]
+        cache[key] = (value, load_time - seconds)
+
+    def wait_for_refresh(self, key):
+        deadline = time.time() + 5
+        while key in self.config._CallableConfig__refreshing and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test___init__(self):
+        self.assertEqual(collections.Counter(self.config.items()), collections.Counter([('a', '0'), ('b', '1')]))
+        self.assertEqual(self.calls, collections.Counter(['a', 'b', 'c']))
+
+    def test_reload_cached(self):
+        self.values['b'] = '2'
+        self.config.reload()
+        self.assertEqual(self.config['b'], '1')
+        self.assertEqual(self.calls['b'], 1)
+
+    def test_reload_refresh_in_background(self):
+        refreshing = threading.Event()
+        refreshed = threading.Event()
+        loader = self.config.loader
+
+        def blocking_loader(key):
+            refreshing.set()
+            refreshed.wait(5)
+            return loader(key)
+
+        self.config.loader = blocking_loader
+        self.values['a'] = '1'
+        self.age('a', 6)
+        self.config.reload()
+        self.assertTrue(refreshing.wait(5))
+        self.assertEqual(self.config['a'], '0')
+        refreshed.set()
+        self.wait_for_refresh('a')
+        self.assertEqual(self.calls['a'], 2)
+        self.config.reload()
+        self.assertEqual(self.config['a'], '1')
+
+    def test_reload_expired(self):
+        self.values['a'] = '1'
+        self.age('a', 11)
+        self.config.reload()
+        self.assertEqual(self.config['a'], '1')
+
+    def test_reload_refresh_failure(self):
+        def loader(key):
+            self.calls[key] += 1
+            raise IOError('unavailable')
+
+        self.config.loader = loader
+        self.age('a', 11)
+        self.config.reload()
+        self.assertEqual(self.config['a'], '0')
+        self.assertIsInstance(self.config.last_refresh_error, IOError)
+
+    def test_reload_load_failure(self):
+        def loader(key):
+            if key == 'b':
+                raise IOError('unavailable')
+            return self.values.get(key)
+
+        config = CallableConfig('test', loader, ['a', 'b'])
+        self.assertEqual(config.items(), [('a', '0')])
+        self.assertIsInstance(config.last_refresh_error, IOError)
+        config.loader = self.values.get
+        config.reload()
+        self.assertEqual(collections.Counter(config.items()), collections.Counter([('a', '0'), ('b', '1')]))
+
+    def test_refresh_thread_does_not_keep_config_alive(self):
+        threads = set(threading.enumerate())
+        self.age('a', 6)
+        self.config.reload()
+        self.wait_for_refresh('a')
+        thread, = set(threading.enumerate()) - threads
+        config_ref = weakref.ref(self.config)
+        self.config = CallableConfig('other', self.values.get, [])
+        gc.collect()
+        self.assertIsNone(config_ref())
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_reload_key_ttls(self):
+        self.values['d'] = '3'
+        del self.config.key_ttls['a']
+        self.config.key_ttls['d'] = None
+        self.config.reload()
+        self.assertEqual(collections.Counter(self.config.items()), collections.Counter([('b', '1'), ('d', '3')]))
+
+    def test_bind(self):
+        obj = Empty()
+        self.config.bind('a', obj, 'a', 'as_int')
+        self.values['a'] = '1'
+        self.age('a', 11)
+        self.config.reload()
+        self.assertEqual(obj.a, 1)
+
+
+class TestReloadScheduler(unittest.TestCase):
+    def setUp(self):
+        self.dict = {'k': 'v'}
+        self.config = DictConfig('test', self.dict, DictConfig('base', {'x': 'y'}))
+        self.scheduler = ReloadScheduler(self.config, 1, 4, jitter=0)
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_run_once_backoff(self):
+        self.scheduler.run_once()
+        self.assertEqual(self.scheduler.interval, 2)
+        self.scheduler.run_once()
+        self.scheduler.run_once()
+        self.assertEqual(self.scheduler.interval, 4)
+        self.dict['k'] = 'v2'
+        self.scheduler.run_once()
+        self.assertEqual(self.scheduler.interval, 1)
+        self.assertEqual(self.scheduler.reload_count, 4)
+        self.assertEqual(self.scheduler.change_count, 1)
+
+    def test_run_once_backoff_unknown_changes(self):
+        self.config = DictConfig('test', self.dict, BaseConfig('base', None))
+        self.scheduler = ReloadScheduler(self.config, 1, 4, jitter=0)
+        for _ in range(4):
+            self.scheduler.run_once()
+        self.assertEqual(self.scheduler.interval, 4)
+        self.assertEqual(self.scheduler.change_count, 0)
+        self.config.base_config._do_reload = lambda: self.config.base_config._set_item_dict({'x': 'y'})
+        self.scheduler.run_once()
+        self.assertEqual(self.scheduler.interval, 1)
+        self.assertEqual(self.scheduler.change_count, 1)
+
+    def test_run_once_unknown_changes_pinned(self):
+        self.config = DictConfig('test', self.dict, BaseConfig('base', None))
+        self.scheduler = ReloadScheduler(self.config, 1, 4, jitter=0)
+        self.scheduler.run_once()
+        self.config.base_config._do_reload = lambda: self.config.base_config._set_item_dict({'x': 'y'})
+        with self.config.pinned():
+            self.scheduler.run_once()
+        self.assertEqual(self.scheduler.interval, 1)
+        self.assertEqual(self.scheduler.change_count, 1)
+
+    def test_run_once_error(self):
+        def fail():
+            raise IOError('unavailable')
+
+        self.config._do_reload = fail
+        self.scheduler.run_once()
+        self.assertEqual(self.scheduler.interval, 2)
+        self.assertEqual(self.scheduler.error_count, 1)
+        self.assertIsInstance(self.scheduler.last_error, IOError)
+
+    def test_run_once_bind_failure(self):
+        obj = Empty()
+        self.assertRaises(ValueError, self.config.bind, 'x', obj, 'x', 'as_int')
+        self.scheduler.run_once()
+        self.assertEqual(self.scheduler.bind_failure_count, 1)
+
+    def test_start(self):
+        self.scheduler = ReloadScheduler(self.config, 0.01, 0.02, jitter=0.5)
+        self.scheduler.start()
+        self.assertIsNotNone(self.scheduler.next_run_time)
+        self.dict['k'] = 'v2'
+        deadline = time.time() + 5
+        while self.scheduler.reload_count < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.config['k'], 'v2')
+        self.assertGreaterEqual(self.scheduler.reload_count, 3)
+        self.scheduler.stop()
+        self.assertIsNone(self.scheduler.next_run_time)
+        reload_count = self.scheduler.reload_count
+        time.sleep(0.05)
+        self.assertEqual(self.scheduler.reload_count, reload_count)
+
+    def test_start_twice(self):
+        self.scheduler.start()
+        self.assertRaises(RuntimeError, ReloadScheduler(self.config, 1).start)
+        self.scheduler.stop()
+        scheduler = ReloadScheduler(self.config, 1)
+        scheduler.start()
+        scheduler.stop()
+
+
+class TestListener(unittest.TestCase):
+    def setUp(self):
+        self.base_dict = {'a': '0', 'b': '${a}'}
+        self.config = DictConfig('test', {'c': '1'}, DictConfig('base', self.base_dict))
+        self.config.set_interpolation()
+        self.events = []
+        self.listener = lambda config, keys: self.events.append((config.name, keys))
+        self.config.add_listener(self.listener)
+
+    def test_listener(self):
+        self.assertEqual(self.config['b'], '0')
+        self.base_dict['a'] = '1'
+        self.config.reload()
+        self.assertEqual(self.events, [('test', {'a', 'b'})])
+
+    def test_remove_listener(self):
+        self.config.remove_listener(self.listener)
+        self.base_dict['a'] = '1'
+        self.config.reload()
+        self.assertEqual(self.events, [])
+        self.assertRaises(ValueError, self.config.remove_listener, self.listener)
+
+    def test_failing_listener(self):
+        def fail(config, keys):
+            raise IOError('unavailable')
+
+        base_config = self.config.base_config
+        base_config.add_listener(fail)
+        self.assertIsNone(self.config.get('d'))
+        self.base_dict['d'] = '2'
+        base_config.reload()
+        self.assertIsInstance(base_config.last_listener_error, IOError)
+        self.assertEqual(self.events, [('test', {'d'})])
+        self.assertEqual(self.config.get('d'), '2')
+
+
+class TestConfigPublisher(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.address = os.path.join(self.dir, 'config.sock')
+        self.dict = {'a': '0', 'b': '1'}
+        self.config = DictConfig('test', self.dict, DictConfig('base', {'c': '2'}))
+        self.publisher = ConfigPublisher(self.config, self.address)
+        self.publisher.start()
+        self.subscribers = []
+
+    def tearDown(self):
+        for subscriber in self.subscribers:
+            subscriber.close()
+        self.publisher.stop()
+        shutil.rmtree(self.dir)
+
+    def subscribe(self):
+        subscriber = SubscriberConfig(self.address, retry_interval=0.01)
+        self.subscribers.append(subscriber)
+        self.wait(subscriber, self.publisher.generation)
+        return subscriber
+
+    def wait(self, subscriber, generation):
+        deadline = time.time() + 5
+        while subscriber.publisher_generation != generation and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(subscriber.publisher_generation, generation)
+
+    def test_full_snapshot(self):
+        subscriber = self.subscribe()
+        self.assertEqual(collections.Counter(subscriber.items()),
+                         collections.Counter([('a', '0'), ('b', '1'), ('c', '2')]))
+        self.assertEqual(subscriber['c'].source, 'base')
+
+    def test_patch(self):
+        subscriber = self.subscribe()
+        obj = Empty()
+        subscriber.bind('a', obj, 'a', 'as_int')
+        self.dict['a'] = '3'
+        del self.dict['b']
+        self.config.reload()
+        self.assertEqual(self.publisher.generation, 1)
+        self.wait(subscriber, 1)
+        self.assertEqual(collections.Counter(subscriber.items()), collections.Counter([('a', '3'), ('c', '2')]))
+        self.assertEqual(obj.a, 3)
+
+    def test_unchanged_reload(self):
+        self.config.reload()
+        self.assertEqual(self.publisher.generation, 0)
+
+    def test_patch_non_utf8(self):
+        subscriber = self.subscribe()
+        self.dict['a'] = '\xff'
+        self.dict['\xc3\xa9'] = '\xc3\xa9'
+        self.config.reload()
+        self.wait(subscriber, 1)
+        self.assertEqual(subscriber['a'], '\xff')
+        self.assertEqual(subscriber['\xc3\xa9'], '\xc3\xa9')
+
+    def test_reload_while_starting(self):
+        self.publisher.stop()
+        add_listener = self.config.add_listener
+
+        def add_listener_and_reload(listener):
+            add_listener(listener)
+            self.dict['a'] = '3'
+            self.config.reload()
+
+        self.config.add_listener = add_listener_and_reload
+        self.publisher.start()
+        subscriber = self.subscribe()
+        self.assertEqual(subscriber['a'], '3')
+
+    def test_reload_pinned(self):
+        subscriber = self.subscribe()
+        with self.config.pinned():
+            self.dict['a'] = '3'
+            self.config.reload()
+            self.assertEqual(self.config['a'], '0')
+        self.assertEqual(self.publisher.generation, 1)
+        self.wait(subscriber, 1)
+        self.assertEqual(subscriber['a'], '3')
+
+    def test_patch_resolves_failed_reference(self):
+        self.config.set_interpolation()
+        self.dict['a'] = '${d}/x'
+        self.config.reload()
+        subscriber = self.subscribe()
+        self.assertIsNone(subscriber.get('a'))
+        self.dict['d'] = '3'
+        self.config.reload()
+        self.wait(subscriber, 2)
+        self.assertEqual(subscriber['a'], '3/x')
+        self.assertEqual(subscriber['d'], '3')
+
+    def test_resync_slow_subscriber(self):
+        self.publisher.max_pending = 1
+        subscriber = self.subscribe()
+        for i in range(1, 21):
+            self.dict['a'] = str(i)
+            self.config.reload()
+        self.wait(subscriber, 20)
+        self.assertEqual(subscriber['a'], '20')
+
+    def test_reconnect(self):
+        subscriber = self.subscribe()
+        self.publisher.stop()
+        self.dict['a'] = '3'
+        self.config.reload()
+        self.publisher.start()
+        self.wait(subscriber, self.publisher.generation)
+        deadline = time.time() + 5
+        while subscriber.get('a') != '3' and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(subscriber['a'], '3')
+
+    def test_patch_does_not_reload_base(self):
+        base_dict = {'e': '4'}
+        subscriber = SubscriberConfig(self.address, DictConfig('base', base_dict), retry_interval=0.01)
+        self.subscribers.append(subscriber)
+        self.wait(subscriber, self.publisher.generation)
+        base_dict['e'] = '5'
+        self.dict['a'] = '3'
+        self.config.reload()
+        self.wait(subscriber, 1)
+        self.assertEqual(subscriber['a'], '3')
+        self.assertEqual(subscriber['e'], '4')
+
+    def test_reconnect_after_malformed_message(self):
+        self.publisher.stop()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.address)
+        server.listen(1)
+        subscriber = SubscriberConfig(self.address, retry_interval=0.01)
+        self.subscribers.append(subscriber)
+        sock = server.accept()[0]
+        sock.sendall(struct.pack('!I', 3) + '{{{')
+        deadline = time.time() + 5
+        while subscriber.last_error is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertIsInstance(subscriber.last_error, ValueError)
+        sock.close()
+        server.close()
+        os.unlink(self.address)
+        self.publisher.start()
+        self.wait(subscriber, self.publisher.generation)
+        self.assertEqual(subscriber['a'], '0')
+
+
+class TestPinned(unittest.TestCase):
+    def setUp(self):
+        self.base_dict = {'a': '0', 'b': '${a}/b'}
+        self.base_config = DictConfig('base', self.base_dict)
+        self.dict = {'c': '1'}
+        self.config = DictConfig('test', self.dict, self.base_config)
+        self.config.set_interpolation()
+
+    def reload(self):
+        self.base_dict['a'] = '2'
+        self.dict['c'] = '3'
+        self.dict['d'] = '4'
+        self.config.reload()
+
+    def test_pinned(self):
+        with self.config.pinned() as config:
+            self.assertIs(config, self.config)
+            self.assertEqual(self.config['b'], '0/b')
+            self.reload()
+            self.assertEqual(self.config['a'], '0')
+            self.assertEqual(self.config['b'], '0/b')
+            self.assertEqual(self.config['c'], '1')
+            self.assertIsNone(self.config.get('d'))
+            self.assertEqual(self.base_config['a'], '0')
+            self.assertEqual(collections.Counter(self.config.items()),
+                             collections.Counter([('a', '0'), ('b', '0/b'), ('c', '1')]))
+        self.assertEqual(self.config['b'], '2/b')
+        self.assertEqual(self.config['d'], '4')
+
+    def test_pinned_nested(self):
+        with self.config.pinned():
+            self.reload()
+            with self.config.pinned():
+                self.assertEqual(self.config['c'], '1')
+            self.assertEqual(self.config['c'], '1')
+        self.assertEqual(self.config['c'], '3')
+
+    def test_pinned_other_thread(self):
+        values = []
+        with self.config.pinned():
+            self.reload()
+            thread = threading.Thread(target=lambda: values.append(self.config['c']))
+            thread.start()
+            thread.join()
+        self.assertEqual(values, ['3'])
+
+    def test_pinned_bind(self):
+        obj = Empty()
+        self.config.bind('c', obj, 'c')
+        with self.config.pinned():
+            self.reload()
+        self.assertEqual(obj.c, '3')
+
+
+class TestMemoryUsage(unittest.TestCase):
+    def setUp(self):
+        self.base_config = DictConfig('base', {'db.host': 'x' * 10000, 'db.port': '5432', 'web.url': '${db.host}'})
+        self.config = DictConfig('test', {'web.port': '80'}, self.base_config)
+        self.config.set_interpolation()
+
+    def test_memory_usage(self):
+        obj = Empty()
+        self.config.bind('web.port', obj, 'port')
+        usage = self.config.memory_usage()
+        self.assertEqual([layer['name'] for layer in usage['layers']], ['test', 'base'])
+        test, base = usage['layers']
+        self.assertEqual(test['item_count'], 1)
+        self.assertEqual(test['bind_count'], 1)
+        self.assertGreater(test['bind_bytes'], 0)
+        self.assertEqual(base['item_count'], 3)
+        self.assertEqual(base['bind_count'], 0)
+        self.assertEqual(base['value_bytes'], 10000 + 4 + 10)
+        self.assertGreater(base['item_overhead_bytes'], 0)
+        self.assertEqual(usage['total'], test['total'] + base['total'])
+        self.assertEqual(set(usage['prefixes']), {'db', 'web'})
+        self.assertGreater(usage['prefixes']['db'], 10000)
+        self.assertEqual(sum(usage['prefixes'].values()),
+                         sum(layer['key_bytes'] + layer['value_bytes'] + layer['item_overhead_bytes']
+                             for layer in usage['layers']))
+
+    def test_memory_usage_cache(self):
+        cache_bytes = self.config.memory_usage()['layers'][0]['cache_bytes']
+        self.config['web.url']
+        self.assertGreater(self.config.memory_usage()['layers'][0]['cache_bytes'], cache_bytes + 10000)
+
+    def test_memory_usage_source(self):
+        test, base = self.config.memory_usage()['layers']
+        self.assertGreater(base['source_bytes'], 10000)
+        self.assertEqual(base['total'], base['key_bytes'] + base['value_bytes'] + base['item_overhead_bytes'] +
+                         base['item_dict_bytes'] + base['bind_bytes'] + base['cache_bytes'] + base['source_bytes'])
+        config = CallableConfig('secrets', lambda key: 'x' * 10000, ['a'], base_config=BaseConfig('empty', None))
+        callable_layer, empty_layer = config.memory_usage()['layers']
+        self.assertGreater(callable_layer['source_bytes'], 10000)
+        self.assertEqual(empty_layer['source_bytes'], 0)
+
+    def test_memory_usage_prefix_depth(self):
+        self.assertEqual(set(self.config.memory_usage(2)['prefixes']), {'db.host', 'db.port', 'web.url', 'web.port'})
+
+
+class TestConfigDigest(unittest.TestCase):
+    def setUp(self):
+        self.base_dict = {'db.host': 'localhost', 'db.pool.size': '10', 'db.pool.timeout': '5', 'name': 'app'}
+        self.dict = {'web.url': 'http://${db.host}/'}
+        self.config = DictConfig('test', self.dict, DictConfig('base', self.base_dict))
+        self.config.set_interpolation()
+        self.digest = ConfigDigest(self.config)
+
+    def tearDown(self):
+        self.digest.close()
+
+    def create_digest(self, value_dict):
+        config = DictConfig('other', value_dict)
+        config.set_interpolation()
+        return ConfigDigest(config)
+
+    def test_digest(self):
+        other = self.create_digest({'name': 'app', 'db.pool.timeout': '5', 'db.pool.size': '10',
+                                    'web.url': 'http://localhost/', 'db.host': 'localhost'})
+        self.assertEqual(self.digest.digest(), other.digest())
+        self.assertEqual(self.digest.children(), {'db': other.digest('db'), 'web': other.digest('web')})
+        self.assertEqual(set(self.digest.children('db')), {'db.pool'})
+        self.assertEqual(set(self.digest.leaves('db.pool')), {'db.pool.size', 'db.pool.timeout'})
+        self.assertRaises(KeyError, self.digest.digest, 'no_such_section')
+
+    def test_reload(self):
+        root = self.digest.digest()
+        web = self.digest.digest('web')
+        pool = self.digest.digest('db.pool')
+        self.base_dict['db.pool.size'] = '20'
+        self.config.reload()
+        self.assertNotEqual(self.digest.digest(), root)
+        self.assertNotEqual(self.digest.digest('db.pool'), pool)
+        self.assertEqual(self.digest.digest('web'), web)
+        self.assertEqual(self.digest.digest(), self.create_digest(dict(self.config.items())).digest())
+
+    def test_reload_interpolated(self):
+        web = self.digest.digest('web')
+        self.base_dict['db.host'] = 'remote'
+        self.config.reload()
+        self.assertNotEqual(self.digest.digest('web'), web)
+        self.assertEqual(self.digest.digest(), self.create_digest(dict(self.config.items())).digest())
+
+    def test_reload_resolves_failed_reference(self):
+        self.dict['cache.dir'] = '${cache.root}/x'
+        self.config.reload()
+        self.assertRaises(KeyError, self.digest.leaves, 'cache')
+        self.base_dict['cache.root'] = '/tmp'
+        self.config.reload()
+        self.assertEqual(set(self.digest.leaves('cache')), {'cache.dir', 'cache.root'})
+        self.assertEqual(self.digest.digest(), self.create_digest(dict(self.config.items())).digest())
+
+    def test_reload_remove_section(self):
+        del self.dict['web.url']
+        self.config.reload()
+        self.assertEqual(set(self.digest.children()), {'db'})
+        self.assertEqual(self.digest.digest(), self.create_digest(dict(self.config.items())).digest())
+
+    def test_diff(self):
+        other = dict(self.config.items())
+        other['db.pool.size'] = '20'
+        other['cache.size'] = '1'
+        del other['name']
+        self.assertEqual(self.digest.diff(self.create_digest(other)), ['cache.size', 'db.pool.size', 'name'])
+        self.assertEqual(self.digest.diff(self.create_digest(dict(self.config.items()))), [])
+
+
 class TestIniFileConfig(unittest.TestCase):
     def setUp(self):
         fd, self.filename = tempfile.mkstemp()
@@ -414,6 +1260,62 @@ c=3
         self.assertEqual(collections.Counter(self.config.items()),
                          collections.Counter([('sec1.x', 'y'), ('sec1.a', '0'), ('sec2.x', 'y'), ('sec2.c', '3')]))
 
+    def test_reload_unchanged_file(self):
+        generation = self.config.generation
+        self.config.reload()
+        self.assertEqual(self.config.generation, generation)
+
+    def test_invalidate(self):
+        os.utime(self.filename, (1000000000, 1000000000))
+        self.config.reload()
+        with open(self.filename, 'r+') as f:
+            content = f.read().replace('d = 4', 'd = 5')
+            f.seek(0)
+            f.write(content)
+        os.utime(self.filename, (1000000000, 1000000000))
+        self.config.invalidate()
+        self.config.reload()
+        self.assertEqual(self.config['sec2.d'], '5')
+
+
+class TestJsonFileConfig(unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as f:
+            f.write('{"x": "y", "sec1": {"a": 0, "b": 1.5, "c": true, "d": null, "sub": {"e": [1, 2, 3]}}}')
+        self.config = JsonFileConfig(self.filename)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test___init__(self):
+        self.assertEqual(self.filename, self.config.name)
+        self.assertIsNone(self.config.base_config)
+        self.assertEqual(collections.Counter(self.config.items()),
+                         collections.Counter([('x', 'y'), ('sec1.a', '0'), ('sec1.b', '1.5'), ('sec1.c', 'true'),
+                                              ('sec1.d', ''), ('sec1.sub.e', '1,2,3')]))
+        self.assertEqual(self.config['sec1.sub.e'].as_int_list(), [1, 2, 3])
+        self.assertIs(type(self.config['x'].key), str)
+
+    def test___init__invalid(self):
+        with open(self.filename, 'w') as f:
+            f.write('[1, 2]')
+        self.assertRaises(ValueError, JsonFileConfig, self.filename)
+
+    def test___init__missing_file(self):
+        self.assertEqual(JsonFileConfig(self.filename + '.missing').items(), [])
+
+    def test_reload(self):
+        with open(self.filename, 'w') as f:
+            f.write('{"sec1": {"a": 1}}')
+        self.config.reload()
+        self.assertEqual(self.config.items(), [('sec1.a', '1')])
+
+    def test_reload_unchanged_file(self):
+        generation = self.config.generation
+        self.config.reload()
+        self.assertEqual(self.config.generation, generation)
+
 
 if __name__ == '__main__':
     unittest.main()